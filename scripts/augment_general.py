@@ -1,8 +1,7 @@
 from __future__ import annotations
 import os, re, pandas as pd
 from scripts.midocean_client import MidoceanClient
-from scripts.utils import write_csv, log
-from scripts.dropbox_uploader import upload_file
+from scripts.utils import stream_csv, log, KEEP_LOCAL_CSV
 
 OUT = os.getenv("OUT_DIR", "out")
 LANG = os.getenv("MIDOCEAN_LANGUAGE", "it")
@@ -347,9 +346,8 @@ def main():
     except Exception as e:
         log.info("SAMPLE unavailable: %s", e)
 
-    # salva + upload
-    write_csv(df, OUTFILE)
-    dest = upload_file(OUTFILE, "general.csv")
+    # upload in streaming (copia locale solo se richiesta)
+    dest = stream_csv(df, "general.csv", tee_path=OUTFILE if KEEP_LOCAL_CSV else None)
     log.info("Augmented and uploaded general.csv → %s", dest)
 
 if __name__ == "__main__":
@@ -1,5 +1,6 @@
 from __future__ import annotations
-import os, json, requests
+import io, os, json, requests
+from toppoint.dropbox_session import DropboxSession
 
 ACCESS_TOKEN = os.getenv("DROPBOX_ACCESS_TOKEN")  # uso diretto token breve se presente
 APP_KEY = os.getenv("DROPBOX_APP_KEY")            # opzionali (fallback)
@@ -46,3 +47,66 @@ def upload_file(local_path: str, dropbox_filename: str) -> str:
             raise DropboxUploadError(f"Upload failed: {r.status_code}: {r.text}")
     return dest_path
 
+
+class DropboxUploadStream(io.RawIOBase):
+    """Sink binario scrivibile che carica su Dropbox mentre i dati vengono generati.
+
+    Adatta a file-object la DropboxSession condivisa con toppoint: i blocchi
+    pieni viaggiano da un thread mentre le righe vengono ancora serializzate.
+    Con ``tee_path`` viene scritta anche una copia locale. Su errore (o
+    ``abort()``) la sessione non viene chiusa e il file precedente su Dropbox
+    resta intatto.
+    """
+
+    def __init__(self, dropbox_filename: str, tee_path: str | None = None):
+        super().__init__()
+        self.dest_path = f"{BASE_PATH}/{dropbox_filename}"
+        self._tee = None
+        if tee_path:
+            os.makedirs(os.path.dirname(tee_path) or ".", exist_ok=True)
+            self._tee = open(tee_path, "wb")
+        self._session = DropboxSession(self.dest_path, _get_access_token(), mute=False)
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        try:
+            self._session.write(bytes(data))
+        except Exception as e:
+            raise DropboxUploadError(f"Upload failed: {self.dest_path}: {e}") from e
+        if self._tee is not None:
+            self._tee.write(data)
+        return len(data)
+
+    def abort(self) -> None:
+        if self.closed:
+            return
+        try:
+            self._session.abort()
+            if self._tee is not None:
+                self._tee.close()
+        finally:
+            super().close()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            if self._tee is not None:
+                self._tee.close()
+            self._session.close()
+        except Exception as e:
+            raise DropboxUploadError(f"Upload failed: {self.dest_path}: {e}") from e
+        finally:
+            super().close()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+            return False
+        return super().__exit__(exc_type, exc, tb)
+
+
+def open_upload_stream(dropbox_filename: str, tee_path: str | None = None) -> DropboxUploadStream:
+    return DropboxUploadStream(dropbox_filename, tee_path)
@@ -1,9 +1,8 @@
 # scripts/print_to_csv.py
 from __future__ import annotations
-import os, pandas as pd
+import os
 from scripts.midocean_client import MidoceanClient
-from scripts.utils import write_csv, log
-from scripts.dropbox_uploader import upload_file
+from scripts.utils import stream_csv, log, KEEP_LOCAL_CSV
 
 OUT = os.getenv("OUT_DIR", "out")
 FILENAME = "print.csv"
@@ -57,11 +56,7 @@ def _first_image_url(images: list) -> str:
         if u: return u
     return ""
 
-def main():
-    client = MidoceanClient()
-    data = client.get("gateway/printdata/1.0", accept="text/json")
-
-    rows = []
+def _rows(data):
     for master in _extract_products(data):
         master_code = master.get("master_code") or ""
         master_id   = master.get("master_id") or ""
@@ -83,7 +78,7 @@ def main():
                 max_colors = tech.get("max_colours") or tech.get("maximum_colors") or tech.get("max_colors") or ""
                 # una riga per ogni colore item, come nel tuo esempio
                 for c in (colors or [""]):
-                    rows.append({
+                    yield {
                         "products__product__product_base_number": master_code,
                         "products__product__product_print_id": master_id,
                         "products__product__print_express_possible": "N",
@@ -98,13 +93,15 @@ def main():
                         "products__product__pps__pp__printing_technique__id": tech_id,
                         "products__product__pps__pp__printing_technique__max_colors": str(max_colors),
                         "products__product__print_position_document": print_template,
-                    })
+                    }
+
+def main():
+    client = MidoceanClient()
+    data = client.get("gateway/printdata/1.0", accept="text/json")
 
-    df = pd.DataFrame(rows, columns=COLUMNS)
-    out_path = os.path.join(OUT, FILENAME)
-    write_csv(df, out_path)
-    dest = upload_file(out_path, FILENAME)
-    log.info("Wrote %s rows → %s; Uploaded → %s", len(df), out_path, dest)
+    out_path = os.path.join(OUT, FILENAME) if KEEP_LOCAL_CSV else None
+    dest = stream_csv(_rows(data), FILENAME, COLUMNS, tee_path=out_path)
+    log.info("Uploaded → %s", dest)
 
 if __name__ == "__main__":
     main()
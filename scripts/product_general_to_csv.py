@@ -1,6 +1,5 @@
 from __future__ import annotations
 import os
-import pandas as pd
 from scripts.midocean_client import MidoceanClient
 from scripts.utils import now_local, time_hms, write_csv, to_upper, log, SUPPLIER
 from scripts.dropbox_uploader import upload_file
@@ -224,10 +223,9 @@ def main():
             }
             rows.append(row)
 
-    df = pd.DataFrame(rows, columns=COLUMNS)
     os.makedirs(OUT, exist_ok=True)
     out_path = os.path.join(OUT, FILENAME)
-    write_csv(df, out_path)
+    write_csv(rows, out_path, COLUMNS)
     log.info("Wrote base general → %s (no upload here; augment will upload)", out_path)
 
 if __name__ == "__main__":
@@ -1,9 +1,8 @@
 # scripts/stock_to_csv.py
 from __future__ import annotations
-import os, pandas as pd
+import os
 from scripts.midocean_client import MidoceanClient
-from scripts.utils import write_csv, log
-from scripts.dropbox_uploader import upload_file
+from scripts.utils import stream_csv, log, KEEP_LOCAL_CSV
 
 OUT = os.getenv("OUT_DIR", "out")
 FILENAME = "stock.csv"
@@ -25,12 +24,7 @@ def _i(x):
     except Exception:
         return 0
 
-def main():
-    client = MidoceanClient()
-    # JSON esplicito
-    data = client.get("gateway/stock/2.0", accept="text/json")
-
-    stock = []
+def _rows(data):
     items = data.get("stock") if isinstance(data, dict) else data
     if not isinstance(items, list):
         items = []
@@ -54,12 +48,16 @@ def main():
             "next_arrival_date": s.get("next_arrival_date") or "",
             "next_arrival_qty": _i(s.get("next_arrival_qty")),
         }
-        stock.append(row)
+        yield row
+
+def main():
+    client = MidoceanClient()
+    # JSON esplicito
+    data = client.get("gateway/stock/2.0", accept="text/json")
 
-    df = pd.DataFrame(stock, columns=COLUMNS)
-    out_path = os.path.join(OUT, FILENAME)
-    write_csv(df, out_path)
-    dest = upload_file(out_path, FILENAME)
+    # righe generate e caricate in streaming, senza file temporaneo
+    out_path = os.path.join(OUT, FILENAME) if KEEP_LOCAL_CSV else None
+    dest = stream_csv(_rows(data), FILENAME, COLUMNS, tee_path=out_path)
     log.info("Uploaded to Dropbox → %s", dest)
 
 if __name__ == "__main__":
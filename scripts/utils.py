@@ -1,11 +1,16 @@
 from __future__ import annotations
-import os, logging
+import csv, io, os, logging
 from datetime import datetime
+from itertools import chain
+from pathlib import Path
 import pytz
+from scripts.dropbox_uploader import open_upload_stream
+from toppoint.csv_writer import atomic_open, projection
 
 TZ = os.getenv("TZ", "Europe/Rome")
 SUPPLIER = os.getenv("SUPPLIER_NAME", "Mid Ocean Brands")
 LANG = os.getenv("MIDOCEAN_LANGUAGE", "it")
+KEEP_LOCAL_CSV = os.getenv("KEEP_LOCAL_CSV", "0") == "1"  # copia locale dei CSV in streaming
 
 # Logging
 logging.basicConfig(
@@ -44,7 +49,55 @@ def to_upper(val: str | None) -> str:
 def ensure_dir(path: str):
     os.makedirs(path, exist_ok=True)
 
-def write_csv(df, path: str):
-    ensure_dir(os.path.dirname(path))
-    df.to_csv(path, index=False)
-    log.info("Wrote %s rows → %s", len(df), path)
+def _write_rows(text, rows, columns: list[str] | None) -> int:
+    """Senza ``columns`` l'intestazione sono le chiavi della prima riga."""
+    if columns is None:
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is None:
+            columns = []
+        else:
+            columns = list(first)
+            rows = chain([first], rows)
+    count = 0
+    project = projection(columns)
+
+    def tuples():
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield project(row)
+
+    writer = csv.writer(text, lineterminator="\n")
+    writer.writerow(columns)
+    writer.writerows(tuples())
+    return count
+
+def write_csv(rows, path: str, columns: list[str] | None = None):
+    """Scrive ``rows`` (DataFrame o iterabile di dict) su file temporaneo + rename atomico."""
+    with atomic_open(Path(path), encoding="utf-8") as f:
+        if hasattr(rows, "to_csv"):
+            rows.to_csv(f, index=False, columns=columns)
+            count = len(rows)
+        else:
+            count = _write_rows(f, rows, columns)
+    log.info("Wrote %s rows → %s", count, path)
+
+def stream_csv(rows, filename: str, columns: list[str] | None = None, tee_path: str | None = None) -> str:
+    """Scrive il CSV direttamente in una upload session Dropbox (niente file temporaneo).
+
+    ``rows`` può essere un DataFrame oppure un iterabile di dict (meglio un
+    generatore: le righe vengono prodotte mentre i blocchi precedenti viaggiano).
+    """
+    count = 0
+    with open_upload_stream(filename, tee_path) as sink:
+        text = io.TextIOWrapper(sink, encoding="utf-8", newline="")
+        if hasattr(rows, "to_csv"):
+            rows.to_csv(text, index=False, columns=columns)
+            count = len(rows)
+        else:
+            count = _write_rows(text, rows, columns)
+        text.flush()
+        text.detach()
+    log.info("Streamed %s rows → Dropbox %s%s", count, sink.dest_path, f" (+ {tee_path})" if tee_path else "")
+    return sink.dest_path
@@ -0,0 +1,84 @@
+"""Confronta i serializzatori CSV su un Products.csv reale.
+
+Uso: python bench_csv_writer.py <Products.csv> [--repeat 3]
+
+Le righe vengono rilette come dict (la forma prodotta dai builder) e riscritte
+con ``csv.DictWriter(extrasaction="ignore")``, con ``DataFrame.to_csv`` (il
+vecchio ``scripts/utils.write_csv``) e con ``csv_writer.write_rows`` /
+``write_columns``. Tutti i file devono risultare identici byte per byte.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import tempfile
+import time
+from pathlib import Path
+
+from csv_writer import write_columns, write_rows
+
+try:
+    import pandas as pd
+except ImportError:  # pandas serve solo alla pipeline midocean
+    pd = None
+
+
+def read_rows(path: Path) -> tuple[list[str], list[dict[str, str]]]:
+    with path.open(encoding="utf-8-sig", newline="") as handle:
+        reader = csv.DictReader(handle)
+        return list(reader.fieldnames or []), list(reader)
+
+
+def dict_writer(destination: Path, headers, rows) -> None:
+    with destination.open("w", newline="", encoding="utf-8-sig") as handle:
+        writer = csv.DictWriter(handle, fieldnames=headers, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def pandas_to_csv(destination: Path, headers, rows) -> None:
+    pd.DataFrame(rows, columns=headers).to_csv(destination, index=False, encoding="utf-8-sig", lineterminator="\r\n")
+
+
+def best_of(repeat: int, func) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("products_csv", type=Path)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    headers, rows = read_rows(args.products_csv)
+    writers = [("csv.DictWriter", dict_writer)]
+    if pd is not None:
+        writers.append(("pandas to_csv", pandas_to_csv))
+    # ColumnStore ha già le colonne: la trasposizione resta fuori dal tempo misurato.
+    columns = [[row[header] for row in rows] for header in headers]
+    writers += [
+        ("csv_writer.write_rows", write_rows),
+        ("csv_writer.write_columns", lambda destination, headers, rows: write_columns(destination, headers, columns)),
+    ]
+
+    print(f"{len(rows)} righe x {len(headers)} colonne")
+    with tempfile.TemporaryDirectory() as tmp:
+        outputs = {}
+        for name, writer in writers:
+            destination = Path(tmp) / f"{len(outputs)}.csv"
+            seconds = best_of(args.repeat, lambda: writer(destination, headers, rows))
+            outputs[name] = destination.read_bytes()
+            print(f"{name:26} {seconds:>8.3f}s")
+        reference = outputs["csv.DictWriter"]
+        different = [name for name, data in outputs.items() if data != reference]
+        if different:
+            print(f"Output diverso da csv.DictWriter: {', '.join(different)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Confronta i backend XML (stdlib ElementTree e lxml) sui feed Toppoint reali.
+
+Uso: python bench_parsers.py <source_root> [--engines stdlib lxml] [--repeat 3]
+
+``source_root`` è la stessa cartella passata a ``build_exports.py`` (con
+``feed-v4``, ``feed-v3``, ``ProductionTimes.xml`` e ``product_images.xml``).
+Ogni backend gira in un processo separato, perché ``TOPPOINT_XML_ENGINE``
+viene letto all'import dei moduli.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+FEEDS = [
+    ("feed-v4/Products_v4.xml", "Products/Product"),
+    ("feed-v4/ProductTranslations_v4.xml", "product"),
+    ("feed-v4/ProductPrices_v4.xml", "Products/Product"),
+    ("feed-v4/Print_v4.xml", "Products/Product"),
+    ("feed-v4/Colors_v4.xml", "Colors/Color"),
+    ("feed-v4/Categories_v4.xml", "Categories/Category"),
+    ("feed-v4/PositionTranslations_v4.xml", "Position"),
+    ("feed-v3/Products_v3.xml", "Products/Product"),
+    ("feed-v3/ProductTranslations_v3.xml", "product"),
+    ("feed-v3/Print_v3.xml", "Products/Product"),
+    ("ProductionTimes.xml", "Product"),
+    ("product_images.xml", "product"),
+]
+
+
+def best_of(repeat: int, func) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def run_engine(source_root: Path, repeat: int) -> dict:
+    import build_exports as base
+    import xml_engine
+
+    result = {"engine": xml_engine.ENGINE, "feeds": {}}
+    for relative, record_path in FEEDS:
+        path = source_root / relative
+        if not path.exists():
+            continue
+        seconds = best_of(repeat, lambda: sum(1 for _ in xml_engine.iter_records(path, record_path)))
+        result["feeds"][relative] = {"bytes": path.stat().st_size, "seconds": seconds}
+
+    data = base.load_indexes(source_root)
+    result["load_indexes"] = best_of(repeat, lambda: base.load_indexes(source_root))
+    with tempfile.TemporaryDirectory() as tmp:
+        result["build_products"] = best_of(repeat, lambda: base.build_products(data, Path(tmp) / "Products.csv"))
+    return result
+
+
+def mb_per_s(size: int, seconds: float) -> str:
+    return f"{size / 1024 / 1024 / seconds:.1f} MB/s" if seconds else "-"
+
+
+def report(results: list[dict]) -> None:
+    engines = [item["engine"] for item in results]
+    print(f"{'feed':34} {'MB':>8} " + " ".join(f"{engine:>22}" for engine in engines))
+    for relative, _ in FEEDS:
+        rows = [item["feeds"].get(relative) for item in results]
+        if not all(rows):
+            continue
+        size = rows[0]["bytes"]
+        cells = " ".join(f"{row['seconds']:>8.3f}s {mb_per_s(size, row['seconds']):>12}" for row in rows)
+        print(f"{relative:34} {size / 1024 / 1024:>8.1f} {cells}")
+    for stage in ("load_indexes", "build_products"):
+        print(f"{stage:34} {'':>8} " + " ".join(f"{item[stage]:>8.3f}s {'':>12}" for item in results))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("source_root", type=Path)
+    parser.add_argument("--engines", nargs="+", default=["stdlib", "lxml"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.json:
+        print(json.dumps(run_engine(args.source_root, args.repeat)))
+        return
+
+    results = []
+    for engine in args.engines:
+        completed = subprocess.run(
+            [sys.executable, __file__, str(args.source_root), "--repeat", str(args.repeat), "--json"],
+            env={**os.environ, "TOPPOINT_XML_ENGINE": engine},
+            cwd=Path(__file__).resolve().parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        if result["engine"] != engine:
+            print(f"Backend {engine} non disponibile, uso {result['engine']}")
+        results.append(result)
+    report(results)
+
+
+if __name__ == "__main__":
+    main()
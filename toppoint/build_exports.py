@@ -1,11 +1,30 @@
 from __future__ import annotations
 
-import csv
+import os
 import re
+import sys
+import time
 import xml.etree.ElementTree as ET
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 
+try:
+    import resource
+except ImportError:  # solo Unix: senza, il picco di memoria non viene riportato
+    resource = None
+
+from column_store import ColumnStore
+from csv_writer import write_rows
+from feed_cache import IndexSnapshots
+from xml_engine import SchemaCollector, iter_records, observing, schema_summary
+
+# Processes used by load_indexes for the independent feeds (1 = sequential).
+LOAD_WORKERS = int(os.getenv("TOPPOINT_LOAD_WORKERS", "0")) or os.cpu_count() or 1
+INDEX_SNAPSHOTS = os.getenv("TOPPOINT_INDEX_SNAPSHOTS", "1") != "0"
+EXPORT_WORKERS = int(os.getenv("TOPPOINT_EXPORT_WORKERS", "0")) or os.cpu_count() or 1
+
 LEGACY_HEADERS = """created
 products__product__product_id
 products__product__color_code
@@ -154,6 +173,11 @@ def unique_join(values, sep=",") -> str:
 
 
 def smart_join(values, sep=",") -> str:
+    return _smart_join(tuple(values), sep)
+
+
+@lru_cache(maxsize=65536)
+def _smart_join(values: tuple, sep: str) -> str:
     vals = list(dict.fromkeys(str(v).strip() for v in values if str(v).strip()))
 
     def key(v: str):
@@ -176,52 +200,107 @@ def yes_no(value: str) -> str:
     return value
 
 
-def flatten(elem: ET.Element, root_strip: str | None = None, skip_direct=None) -> dict[str, str]:
-    skip_direct = set(skip_direct or [])
-    acc: dict[str, list[str]] = defaultdict(list)
+NO_SKIP: frozenset = frozenset()
+
+
+class Flattener:
+    """Flatten Elements into ``{tag__path: joined values}`` with a learned path plan.
+
+    Every distinct tag path is compiled once into a plan node (output key,
+    attribute keys, child plans), so flattening a product is a walk that only
+    looks up plans and appends values; keys and values match the recursive
+    walk exactly (document order, attributes before children, ``unique_join``
+    of repeated values, ``root_strip`` applied last).
+    """
+
+    def __init__(self, root_strip: str | None = None, skip_direct=None, leaf_suffix: str | None = None):
+        self.prefix = root_strip + "__" if root_strip else None
+        self.skip_direct = frozenset(skip_direct or ())
+        self.leaf_suffix = leaf_suffix
+        self.roots: dict[str, list] = {}
+        self.output: dict[str, str] = {}
+
+    def _plan(self, path: str) -> list:
+        # [path, leaf key (None = leaf values are not kept), attribute keys, child plans]
+        leaf_key = path
+        if self.leaf_suffix is not None:
+            leaf_key = path.replace(self.leaf_suffix, "") if path.endswith(self.leaf_suffix) else None
+        return [path, leaf_key, {}, {}]
+
+    def _key(self, path: str) -> str:
+        key = self.output.get(path)
+        if key is None:
+            prefix = self.prefix
+            key = path[len(prefix):] if prefix and path.startswith(prefix) else path
+            self.output[path] = key
+        return key
+
+    def __call__(self, elem: ET.Element) -> dict[str, str]:
+        acc: dict[str, object] = {}
+        plan = self.roots.get(elem.tag)
+        if plan is None:
+            plan = self.roots[elem.tag] = self._plan(elem.tag)
+        self._walk(elem, plan, acc, self.skip_direct)
+        output = self._key
+        return {
+            output(key): sys.intern(unique_join(value, ", ") if value.__class__ is list else value.strip())
+            for key, value in acc.items()
+        }
 
-    def walk(node: ET.Element, path: str = ""):
-        if path and path.count("__") == 0 and node.tag in skip_direct:
+    def _walk(self, node: ET.Element, plan: list, acc: dict, skip: frozenset) -> None:
+        path, leaf_key, attr_keys, children = plan
+        if node.attrib and self.leaf_suffix is None:
+            for name, value in node.attrib.items():
+                if value:
+                    key = attr_keys.get(name)
+                    if key is None:
+                        key = attr_keys[name] = f"{path}__@{name}"
+                    previous = acc.get(key)
+                    if previous is None:
+                        acc[key] = value
+                    elif previous.__class__ is list:
+                        previous.append(value)
+                    else:
+                        acc[key] = [previous, value]
+        if len(node) == 0:
+            value = node.text
+            if value and leaf_key is not None:
+                value = value.strip()
+                if value:
+                    previous = acc.get(leaf_key)
+                    if previous is None:
+                        acc[leaf_key] = value
+                    elif previous.__class__ is list:
+                        previous.append(value)
+                    else:
+                        acc[leaf_key] = [previous, value]
             return
-        current = f"{path}__{node.tag}" if path else node.tag
-        for name, value in node.attrib.items():
-            if value:
-                acc[f"{current}__@{name}"].append(value)
-        children = list(node)
-        if not children:
-            value = (node.text or "").strip()
-            if value:
-                acc[current].append(value)
-        else:
-            for child in children:
-                if current == elem.tag and child.tag in skip_direct:
-                    continue
-                walk(child, current)
-
-    walk(elem)
-    result = {k: unique_join(v, ", ") for k, v in acc.items()}
-    if root_strip:
-        prefix = root_strip + "__"
-        result = {(k[len(prefix):] if k.startswith(prefix) else k): v for k, v in result.items()}
-    return result
+        for child in node:
+            tag = child.tag
+            if skip and tag in skip:
+                continue
+            child_plan = children.get(tag)
+            if child_plan is None:
+                child_plan = children[tag] = self._plan(f"{path}__{tag}")
+            self._walk(child, child_plan, acc, NO_SKIP)
 
 
-def flatten_it_translation(elem: ET.Element) -> dict[str, str]:
-    acc: dict[str, list[str]] = defaultdict(list)
-
-    def walk(node: ET.Element, path: str = ""):
-        current = f"{path}__{node.tag}" if path else node.tag
-        children = list(node)
-        if not children:
-            value = (node.text or "").strip()
-            if value and node.tag.endswith("-it_IT"):
-                acc[current.replace("-it_IT", "")].append(value)
-        else:
-            for child in children:
-                walk(child, current)
+_FLATTENERS: dict[tuple, Flattener] = {}
 
-    walk(elem)
-    return {k: unique_join(v, ", ") for k, v in acc.items()}
+
+def flatten(elem: ET.Element, root_strip: str | None = None, skip_direct=None) -> dict[str, str]:
+    key = (root_strip, frozenset(skip_direct or ()))
+    flattener = _FLATTENERS.get(key)
+    if flattener is None:
+        flattener = _FLATTENERS[key] = Flattener(root_strip, skip_direct)
+    return flattener(elem)
+
+
+_IT_FLATTENER = Flattener(leaf_suffix="-it_IT")
+
+
+def flatten_it_translation(elem: ET.Element) -> dict[str, str]:
+    return _IT_FLATTENER(elem)
 
 
 def square_1600(url: str) -> str:
@@ -235,74 +314,243 @@ def square_1600(url: str) -> str:
     )
 
 
+@lru_cache(maxsize=None)
 def normalize(value: str) -> str:
     return re.sub(r"[\s_-]+", " ", (value or "").strip().lower())
 
 
-def load_indexes(source_root: Path):
-    feed = source_root / "feed-v4"
-    products_root = ET.parse(feed / "Products_v4.xml").getroot()
-    created = text(products_root, "Created")
-    products = products_root.find("Products").findall("Product")
-
-    color_root = ET.parse(feed / "Colors_v4.xml").getroot()
-    colors = {}
-    color_flat = {}
-    for node in color_root.find("Colors").findall("Color"):
+PRODUCT_SECTIONS = ("Print_Information", "Logistic_Information", "Sustainability_Compliance", "Product_Properties")
+NO_FIELDS: dict[str, str] = {}
+NO_SECTION: tuple[dict, dict] = ({}, {})
+
+
+def child_maps(elem: ET.Element) -> tuple[dict[str, str], dict[str, dict[str, str]]]:
+    """Text and attributes of each child tag, first occurrence only (what ``find`` returns)."""
+    fields: dict[str, str] = {}
+    attrs: dict[str, dict[str, str]] = {}
+    for child in elem:
+        tag = child.tag
+        if tag in fields:
+            continue
+        fields[tag] = sys.intern((child.text or "").strip())
+        if child.attrib:
+            attrs[tag] = {name: sys.intern(value) for name, value in child.attrib.items()}
+    return fields, attrs
+
+
+class ProductRecord:
+    """What the row builders read from a V4 <Product>, extracted once at load time.
+
+    Direct children and the ``PRODUCT_SECTIONS`` are kept as tag -> text and
+    tag -> attributes maps, so every helper is a dict lookup instead of a
+    ``find`` over the children. The record is plain data and can be pickled
+    across processes and into the index snapshots. Values are interned, so the
+    codes, units and flags repeated across thousands of products share one
+    string.
+    """
+
+    __slots__ = (
+        "fields", "attrs", "pid", "leaves", "sections", "colors",
+        "category_ids", "complementary", "optional_prints", "flat",
+    )
+
+    def __init__(self, node: ET.Element):
+        self.fields, self.attrs = child_maps(node)
+        self.pid = self.fields.get("Product_Id", "")
+        self.leaves = {}
+        self.sections = {}
+        self.colors: list[dict[str, str]] = []
+        self.category_ids: list[str] = []
+        self.complementary: list[str] = []
+        self.optional_prints: list[dict[str, str]] | None = None
+        for child in node:
+            tag = child.tag
+            if len(child) == 0:
+                self.leaves.setdefault(tag, sys.intern((child.text or "").strip()))
+            elif tag in PRODUCT_SECTIONS and tag not in self.sections:
+                self.sections[tag] = child_maps(child)
+                if tag == "Print_Information":
+                    optional = child.find("Optional_Prints")
+                    if optional is not None:
+                        self.optional_prints = [child_maps(item)[0] for item in optional.findall("Optional_print")]
+            if tag == "Categories":
+                self.category_ids.extend(sys.intern(text(item, ".")) for item in child.findall("Category_Id"))
+            elif tag == "Complementary_Products":
+                self.complementary.extend(sys.intern(text(item, ".")) for item in child.findall("Product_Id"))
+        colors = node.find("Colors")
+        if colors is not None:
+            for color in colors.findall("Color"):
+                self.colors.append({
+                    "id": sys.intern(color.attrib.get("id", "")),
+                    "EAN_Code": text(color, "EAN_Code"),
+                    "Image_Color": sys.intern(text(color, "Image_Color")),
+                })
+        self.flat = flatten(node, "Product", skip_direct={"Colors"})
+
+    def text(self, tag: str) -> str:
+        return self.fields.get(tag, "")
+
+    def attr(self, tag: str, name: str) -> str:
+        return self.attrs.get(tag, NO_FIELDS).get(name, "")
+
+    def section_text(self, section: str, tag: str) -> str:
+        return self.sections.get(section, NO_SECTION)[0].get(tag, "")
+
+    def section_attr(self, section: str, tag: str, name: str) -> str:
+        return self.sections.get(section, NO_SECTION)[1].get(tag, NO_FIELDS).get(name, "")
+
+
+def load_products(path: Path):
+    header: dict[str, str] = {}
+    products = [ProductRecord(node) for node in iter_records(path, "Products/Product", header)]
+    return products, header.get("Created", "")
+
+
+def load_colors(path: Path):
+    colors, color_flat = {}, {}
+    for node in iter_records(path, "Colors/Color"):
         code = text(node, "Color_Code")
         colors[code] = {child.tag: (child.text or "").strip() for child in list(node)}
         color_flat[code] = flatten(node, "Color")
+    return colors, color_flat
+
 
-    category_root = ET.parse(feed / "Categories_v4.xml").getroot()
-    categories = {}
-    category_flat = {}
-    for node in category_root.find("Categories").findall("Category"):
+def load_categories(path: Path):
+    categories, category_flat = {}, {}
+    for node in iter_records(path, "Categories/Category"):
         cid = text(node, "Category_Id")
         categories[cid] = {child.tag: (child.text or "").strip() for child in list(node)}
         category_flat[cid] = flatten(node, "Category")
+    return categories, category_flat
+
+
+class TranslationRecord:
+    """Only the ``*-it_IT`` values of a translation are ever read: those and the flattened columns."""
+
+    __slots__ = ("direct", "properties", "it_flat")
 
-    trans_root = ET.parse(feed / "ProductTranslations_v4.xml").getroot()
-    translations = {text(node, "code"): node for node in trans_root.findall("product")}
+    def __init__(self, node: ET.Element):
+        self.direct: dict[str, str] = {}
+        self.properties: dict[str, str] = {}
+        for child in node:
+            if child.tag.endswith("-it_IT"):
+                self.direct.setdefault(child.tag, sys.intern((child.text or "").strip()))
+        props = node.find("Product_Properties")
+        if props is not None:
+            for child in props:
+                if child.tag.endswith("-it_IT"):
+                    self.properties.setdefault(child.tag, sys.intern((child.text or "").strip()))
+        self.it_flat = flatten_it_translation(node)
 
-    price_root = ET.parse(feed / "ProductPrices_v4.xml").getroot()
+
+def load_translations(path: Path) -> dict[str, TranslationRecord]:
+    return {text(node, "code"): TranslationRecord(node) for node in iter_records(path, "product")}
+
+
+def load_prices(path: Path):
     prices = {}
     max_tiers = 0
-    for node in price_root.find("Products").findall("Product"):
+    for node in iter_records(path, "Products/Product"):
         pid, color = text(node, "Product_Id"), text(node, "Color_Code")
         price_node = node.find("Prices")
         tiers = []
         if price_node is not None:
             for tier in price_node.findall("Price"):
-                tiers.append({child.tag: (child.text or "").strip() for child in list(tier)})
+                tiers.append({child.tag: sys.intern((child.text or "").strip()) for child in list(tier)})
         max_tiers = max(max_tiers, len(tiers))
         prices[(pid, color)] = {
             "excluded": text(price_node, "Excluded_From_Discount"),
             "tiers": tiers,
         }
+    return prices, max_tiers
 
-    print_root = ET.parse(feed / "Print_v4.xml").getroot()
+
+def load_print_positions(path: Path):
     print_rows = []
     prints_by_product: dict[str, list[dict[str, str]]] = defaultdict(list)
-    for product in print_root.find("Products").findall("Product"):
+    for product in iter_records(path, "Products/Product"):
         pid = text(product, "Product_Code")
         positions = product.find("Positions")
         if positions is None:
             continue
         for pos in positions.findall("Position"):
-            row = {child.tag: (child.text or "").strip() for child in list(pos)}
+            row = {child.tag: sys.intern((child.text or "").strip()) for child in list(pos)}
             row["Product_Code"] = pid
             print_rows.append(row)
             prints_by_product[pid].append(row)
+    return print_rows, prints_by_product
+
 
-    position_root = ET.parse(feed / "PositionTranslations_v4.xml").getroot()
+def load_position_titles(path: Path) -> dict[str, str]:
     position_it = {}
-    for node in position_root.findall("Position"):
+    for node in iter_records(path, "Position"):
         key = text(node, "Position")
         position_it[key] = text(node, "IT_Position_Title") or text(node, "EN_Position_Title") or key
+    return position_it
 
-    production_root = ET.parse(source_root / "ProductionTimes.xml").getroot()
-    production_index: dict[tuple[str, str, str, str], list[dict]] = defaultdict(list)
-    for product in production_root.findall("Product"):
+
+def tier_days(tiers: list[dict[str, str]]) -> str:
+    """Days for 2500 pieces: the tier ending at 2500, else the one containing it, else the last."""
+    for tier in tiers:
+        if tier.get("Till") == "2500":
+            return tier.get("Days", "")
+    for tier in tiers:
+        try:
+            if int(tier["From"]) <= 2500 <= int(tier["Till"]):
+                return tier.get("Days", "")
+        except (KeyError, ValueError):
+            pass
+    return tiers[-1].get("Days", "") if tiers else ""
+
+
+class ProductionTimes:
+    """Production days per print position, resolved from ProductionTimes.xml.
+
+    ``table`` maps (product, print group, method, position) to the days of the
+    first candidate record plus, for each ``Number_Of_Colors`` value, the rank
+    and days of its first record, so a lookup picks the first matching
+    candidate exactly like a scan of the record list. Results are memoised on
+    the full (product, group, method, position, colours) key.
+    """
+
+    def __init__(self):
+        self.table: dict[tuple[str, str, str, str], tuple[str, dict[str, tuple[int, str]]]] = {}
+        self.resolved: dict[tuple[str, str, str, str, str], str] = {}
+
+    def add(self, pid: str, record: dict[str, str], tiers: list[dict[str, str]]) -> None:
+        key = (pid, record.get("Print_Group", ""), normalize(record.get("Print_Method", "")), normalize(record.get("Position_Name", "")))
+        days = sys.intern(tier_days(tiers))
+        entry = self.table.get(key)
+        if entry is None:
+            entry = self.table[key] = (days, {})
+        by_colors = entry[1]
+        by_colors.setdefault(record.get("Number_Of_Colors", ""), (len(by_colors), days))
+
+    def days(self, pid: str, pos: dict[str, str]) -> str:
+        group, method, position = pos.get("Print_Group", ""), pos.get("Print_Method", ""), pos.get("Position", "")
+        colors = pos.get("Number_Of_Colors", "")
+        memo = (pid, group, method, position, colors)
+        days = self.resolved.get(memo)
+        if days is None:
+            days = self.resolved[memo] = self._resolve((pid, group, normalize(method), normalize(position)), colors)
+        return days
+
+    def _resolve(self, key: tuple[str, str, str, str], colors: str) -> str:
+        entry = self.table.get(key)
+        if entry is None:
+            return ""
+        first_days, by_colors = entry
+        match = by_colors.get(colors)
+        if colors.lower().startswith("full"):
+            full = by_colors.get("FC")
+            if full is not None and (match is None or full[0] < match[0]):
+                match = full
+        return match[1] if match is not None else first_days
+
+
+def load_production_times(path: Path) -> ProductionTimes:
+    production = ProductionTimes()
+    for product in iter_records(path, "Product"):
         pid = text(product, "Product_Code")
         positions = product.find("Positions")
         if positions is None:
@@ -314,12 +562,13 @@ def load_indexes(source_root: Path):
             if tiers_node is not None:
                 for tier in tiers_node.findall("ProductionTime"):
                     tiers.append({child.tag: (child.text or "").strip() for child in list(tier)})
-            record["tiers"] = tiers
-            production_index[(pid, record.get("Print_Group", ""), normalize(record.get("Print_Method", "")), normalize(record.get("Position_Name", "")))].append(record)
+            production.add(pid, record, tiers)
+    return production
+
 
-    image_root = ET.parse(source_root / "product_images.xml").getroot()
+def load_images(path: Path) -> dict[str, list[str]]:
     images = {}
-    for product in image_root.findall("product"):
+    for product in iter_records(path, "product"):
         variants = product.find("variants")
         if variants is None:
             continue
@@ -333,85 +582,159 @@ def load_indexes(source_root: Path):
                     if url:
                         urls.append(square_1600(url))
             images[code] = list(dict.fromkeys(urls))
+    return images
 
-    return {
-        "created": created,
-        "products": products,
-        "colors": colors,
-        "color_flat": color_flat,
-        "categories": categories,
-        "category_flat": category_flat,
-        "translations": translations,
-        "prices": prices,
-        "max_tiers": max_tiers,
-        "print_rows": print_rows,
-        "prints_by_product": prints_by_product,
-        "position_it": position_it,
-        "production_index": production_index,
-        "images": images,
-    }
 
+def loader_tasks(source_root: Path) -> list[tuple]:
+    """(loader, file, ``data`` keys) for every index the builders read."""
+    feed = source_root / "feed-v4"
+    return [
+        (load_products, feed / "Products_v4.xml", ("products", "created")),
+        (load_colors, feed / "Colors_v4.xml", ("colors", "color_flat")),
+        (load_categories, feed / "Categories_v4.xml", ("categories", "category_flat")),
+        (load_translations, feed / "ProductTranslations_v4.xml", "translations"),
+        (load_prices, feed / "ProductPrices_v4.xml", ("prices", "max_tiers")),
+        (load_print_positions, feed / "Print_v4.xml", ("print_rows", "prints_by_product")),
+        (load_position_titles, feed / "PositionTranslations_v4.xml", "position_it"),
+        (load_production_times, source_root / "ProductionTimes.xml", "production_times"),
+        (load_images, source_root / "product_images.xml", "images"),
+    ]
+
+
+def run_loader(loader, path: Path, snapshots: IndexSnapshots | None = None, key=None):
+    value = loader(path)
+    if snapshots is not None:
+        snapshots.store(loader, path, key, value)
+    return value
 
-def production_days(index, pid: str, pos: dict[str, str]) -> str:
-    key = (pid, pos.get("Print_Group", ""), normalize(pos.get("Print_Method", "")), normalize(pos.get("Position", "")))
-    candidates = index.get(key, [])
-    if not candidates:
-        return ""
-    colors = pos.get("Number_Of_Colors", "")
 
-    def same_color(record):
-        value = record.get("Number_Of_Colors", "")
-        return value == colors or (value == "FC" and colors.lower().startswith("full"))
+def run_fused(loader, path: Path, snapshots: IndexSnapshots | None = None, key=None, schema_key=None):
+    """``loader(path)`` and ``schema_summary(path)`` from a single parse of the file."""
+    collector = SchemaCollector(path)
+    with observing(path, collector):
+        value = loader(path)
+    schema = collector.summary() if collector.complete else schema_summary(path)
+    if snapshots is not None:
+        snapshots.store(loader, path, key, value)
+        snapshots.store(schema_summary, path, schema_key, schema)
+    return value, schema
 
-    record = next((item for item in candidates if same_color(item)), candidates[0])
-    for tier in record["tiers"]:
-        if tier.get("Till") == "2500":
-            return tier.get("Days", "")
-    for tier in record["tiers"]:
-        try:
-            if int(tier["From"]) <= 2500 <= int(tier["Till"]):
-                return tier.get("Days", "")
-        except (KeyError, ValueError):
-            pass
-    return record["tiers"][-1].get("Days", "") if record["tiers"] else ""
+
+def schema_tasks(paths, source_root: Path) -> list:
+    """Loader tasks that put ``schema_summary`` of each XML in ``data["schema:<relative path>"]``."""
+    return [(schema_summary, path, f"schema:{Path(path).relative_to(source_root).as_posix()}") for path in paths]
+
+
+def load_indexes(source_root: Path, extra_tasks=()):
+    return load_tasks(loader_tasks(source_root) + list(extra_tasks))
+
+
+def load_tasks(tasks) -> dict:
+    """Build the feed indexes, reading the independent files in parallel.
+
+    Each task (loader, path, keys) runs in a pool process and returns plain
+    data, Products_v4 included as ``ProductRecord``s. A task whose source file
+    is unchanged since the last run is served from its snapshot. Tasks listed
+    twice (profiles sharing a loader) run once, and a ``schema_summary`` task
+    on a file that another loader reads rides along on that loader's parse,
+    so every XML is parsed at most once.
+    """
+    started = time.perf_counter()
+    tasks = list(dict.fromkeys(tasks))
+    snapshots = IndexSnapshots() if INDEX_SNAPSHOTS else None
+    data = {}
+
+    def store(keys, value):
+        if isinstance(keys, str):
+            data[keys] = value
+        else:
+            data.update(zip(keys, value))
+
+    def store_job(kind, keys, value):
+        if kind == "fused":  # (loader keys, schema key) -> (index, schema)
+            for task_keys, task_value in zip(keys, value):
+                store(task_keys, task_value)
+        else:
+            store(keys, value)
+
+    pending = []
+    for func, path, keys in tasks:
+        key = None
+        if snapshots is not None:
+            key = snapshots.key(func, path)
+            value = snapshots.load(func, path, key)
+            if value is not None:
+                store(keys, value)
+                continue
+        pending.append((func, path, keys, key))
+
+    schemas = {path: (keys, key) for func, path, keys, key in pending if func is schema_summary}
+    runners = {"loader": run_loader, "fused": run_fused}
+    jobs = []
+    for func, path, keys, key in pending:
+        if func is schema_summary:
+            continue
+        if path in schemas:
+            schema_keys, schema_key = schemas.pop(path)
+            jobs.append(("fused", (func, path, snapshots, key, schema_key), (keys, schema_keys)))
+        else:
+            jobs.append(("loader", (func, path, snapshots, key), keys))
+    for path, (keys, key) in schemas.items():
+        jobs.append(("loader", (schema_summary, path, snapshots, key), keys))
+
+    workers = min(LOAD_WORKERS, len(jobs))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [(kind, keys, pool.submit(runners[kind], *args)) for kind, args, keys in jobs]
+            for kind, keys, future in futures:
+                store_job(kind, keys, future.result())
+    else:
+        for kind, args, keys in jobs:
+            store_job(kind, keys, runners[kind](*args))
+
+    print(
+        f"Indici caricati in {time.perf_counter() - started:.1f}s "
+        f"({len({path for _, path, _ in tasks})} file, {len(tasks) - len(pending)} di {len(tasks)} indici da snapshot, "
+        f"{max(workers, 1)} processi)"
+    )
+    return data
+
+
+def attr(product: ProductRecord, path: str, name: str) -> str:
+    return product.attr(path, name)
 
 
-def attr(product: ET.Element, path: str, name: str) -> str:
-    node = product.find(path)
-    return node.attrib.get(name, "") if node is not None else ""
+def logistic_attr(product: ProductRecord, node_name: str, attr_name: str) -> str:
+    return product.section_attr("Logistic_Information", node_name, attr_name)
 
 
-def logistic_attr(product: ET.Element, node_name: str, attr_name: str) -> str:
-    logistic = product.find("Logistic_Information")
-    node = logistic.find(node_name) if logistic is not None else None
-    return node.attrib.get(attr_name, "") if node is not None else ""
+def logistic_text(product: ProductRecord, name: str) -> str:
+    return product.section_text("Logistic_Information", name)
 
 
-def logistic_text(product: ET.Element, name: str) -> str:
-    return text(product.find("Logistic_Information"), name)
+def sustainability(product: ProductRecord, name: str) -> str:
+    return product.section_text("Sustainability_Compliance", name)
 
 
-def sustainability(product: ET.Element, name: str) -> str:
-    return text(product.find("Sustainability_Compliance"), name)
+def property_text(product: ProductRecord, name: str) -> str:
+    return product.section_text("Product_Properties", name)
 
 
-def property_text(product: ET.Element, name: str) -> str:
-    return text(product.find("Product_Properties"), name)
+def property_attr(product: ProductRecord, name: str, attr_name="Value") -> str:
+    return product.section_attr("Product_Properties", name, attr_name)
 
 
-def property_attr(product: ET.Element, name: str, attr_name="Value") -> str:
-    props = product.find("Product_Properties")
-    node = props.find(name) if props is not None else None
-    return node.attrib.get(attr_name, "") if node is not None else ""
+def print_text(product: ProductRecord, name: str) -> str:
+    return product.section_text("Print_Information", name)
 
 
 def translation_it(index, pid: str, prop: str) -> str:
-    node = index.get(pid)
-    if node is None:
+    record = index.get(pid)
+    if record is None:
         return ""
     if prop in {"title", "description", "search_term"}:
-        return text(node, f"{prop}-it_IT")
-    return text(node.find("Product_Properties"), f"{prop}-it_IT")
+        return record.direct.get(f"{prop}-it_IT", "")
+    return record.properties.get(f"{prop}-it_IT", "")
 
 
 def position_aggregate(data, pid: str) -> dict[str, str]:
@@ -423,7 +746,7 @@ def position_aggregate(data, pid: str) -> dict[str, str]:
             dimensions.append(f"{width}X{height}")
         elif diameter not in {"", "0"}:
             dimensions.append(f"Ø{diameter}")
-        days = production_days(data["production_index"], pid, pos)
+        days = data["production_times"].days(pid, pos)
         if days:
             times.append(days)
         if pos.get("Print_Method") and pos.get("Minimum_Order_Quantity"):
@@ -455,43 +778,36 @@ def position_aggregate(data, pid: str) -> dict[str, str]:
     }
 
 
-def optional_prints(product: ET.Element, name: str) -> str:
-    print_info = product.find("Print_Information")
-    optional = print_info.find("Optional_Prints") if print_info is not None else None
-    if optional is None:
+def optional_prints(product: ProductRecord, name: str) -> str:
+    if product.optional_prints is None:
         return ""
-    return smart_join(text(node, name) for node in optional.findall("Optional_print"))
+    return smart_join(item.get(name, "") for item in product.optional_prints)
 
 
-def build_legacy_row(data, product: ET.Element, color_node: ET.Element | None) -> dict[str, str]:
-    pid = text(product, "Product_Id")
-    color = color_node.attrib.get("id", "") if color_node is not None else ""
-    compatibility_color = color or "N0999"
-    print_info = product.find("Print_Information")
+def build_legacy_row(data, product: ProductRecord, color: dict[str, str] | None, aggregate=None) -> dict[str, str]:
+    pid = product.pid
+    compatibility_color = (color["id"] if color is not None else "") or "N0999"
     color_info = data["colors"].get(compatibility_color, {})
-    aggregate = position_aggregate(data, pid)
+    if aggregate is None:
+        aggregate = position_aggregate(data, pid)
     price_record = data["prices"].get((pid, compatibility_color), {})
     tiers = price_record.get("tiers", [])
     first_price = min(tiers, key=lambda x: int(x.get("Start") or 999999)).get("Price", "") if tiers else ""
-    variants = product.find("Colors")
-    color_codes = [node.attrib.get("id", "") for node in variants.findall("Color")] if variants is not None else []
-    category_ids = [text(node, ".") for node in product.findall("./Categories/Category_Id")]
-    category_titles = [data["categories"].get(cid, {}).get("IT_Description", "") for cid in category_ids]
-    complementary = [text(node, ".") for node in product.findall("./Complementary_Products/Product_Id")]
+    color_codes = [variant["id"] for variant in product.colors]
+    category_titles = [data["categories"].get(cid, {}).get("IT_Description", "") for cid in product.category_ids]
 
     weight = attr(product, "ProductWeight", "Weight")
-    weight_node = product.find("ProductWeight")
-    if weight and weight_node is not None and weight_node.attrib.get("unit", "").lower() == "kg":
+    if weight and attr(product, "ProductWeight", "unit").lower() == "kg":
         try:
             weight = f"{float(weight) * 1000:g}"
         except ValueError:
             pass
 
-    image_color = text(color_node, "Image_Color") if color_node is not None else ""
+    image_color = color["Image_Color"] if color is not None else ""
     additional_images = data["images"].get(f"{pid}-{compatibility_color}", [])
-    minimum = text(product, "Minimum")
+    minimum = product.text("Minimum")
 
-    row = {header: "" for header in LEGACY_HEADERS}
+    row = dict.fromkeys(LEGACY_HEADERS, "")
     row.update({
         "created": data["created"],
         "products__product__product_id": pid,
@@ -503,29 +819,29 @@ def build_legacy_row(data, product: ET.Element, color_node: ET.Element | None) -
         "products__product__volume": attr(product, "ProductVolume", "Volume"),
         "products__product__weight": weight,
         "products__product__minimum": minimum,
-        "products__product__minimum_start": text(print_info, "Minimum_Start"),
-        "products__product__only_blank": text(product, "Only_Blank"),
-        "products__product__only_print": text(product, "Only_Print"),
+        "products__product__minimum_start": print_text(product, "Minimum_Start"),
+        "products__product__only_blank": product.text("Only_Blank"),
+        "products__product__only_print": product.text("Only_Print"),
         "products__product__dangerous_goods": yes_no(logistic_text(product, "Dangerous_Goods")),
         "products__product__dangerous_goods_surcharge": "0",
         "products__product__breaking_risk": yes_no(logistic_text(product, "Breaking_Risk")),
         "products__product__prices__price__price": first_price,
-        "products__product__print_possible": "Yes" if text(print_info, "Print_Group") else "No",
-        "products__product__print_group": text(print_info, "Print_Group"),
-        "products__product__print_method": text(print_info, "Print_Method"),
+        "products__product__print_possible": "Yes" if print_text(product, "Print_Group") else "No",
+        "products__product__print_group": print_text(product, "Print_Group"),
+        "products__product__print_method": print_text(product, "Print_Method"),
         "products__product__print_group_optional": optional_prints(product, "Optional_Print_Group"),
         "products__product__print_method_optional": optional_prints(product, "Optional_Print_Method"),
-        "products__product__print_size": text(print_info, "Print_Size"),
-        "products__product__print_maximum_colors": text(print_info, "Print_Maximum_Colors"),
-        "products__product__print_positions": text(print_info, "Print_Positions"),
-        "products__product__handling_code": text(print_info, "Handling_Code"),
-        "products__product__express_delivery": "No" if text(print_info, "Print_Group") else "",
-        "products__product__image_together": text(product, "Image_Together"),
+        "products__product__print_size": print_text(product, "Print_Size"),
+        "products__product__print_maximum_colors": print_text(product, "Print_Maximum_Colors"),
+        "products__product__print_positions": print_text(product, "Print_Positions"),
+        "products__product__handling_code": print_text(product, "Handling_Code"),
+        "products__product__express_delivery": "No" if print_text(product, "Print_Group") else "",
+        "products__product__image_together": product.text("Image_Together"),
         "products__product__image_color": image_color,
         "categories": unique_join(category_titles),
-        "products__product__complementary_products__product_id": unique_join(complementary),
+        "products__product__complementary_products__product_id": unique_join(product.complementary),
         "products__product__colors": smart_join([code or "N0999" for code in color_codes] or ["N0999"], ", "),
-        "products__product__brand": text(product, "Brand"),
+        "products__product__brand": product.text("Brand"),
         "products__product__material": translation_it(data["translations"], pid, "Material"),
         "products__product__mechanism": translation_it(data["translations"], pid, "Mechanism"),
         "products__product__mechanical": property_text(product, "Mechanical"),
@@ -536,22 +852,22 @@ def build_legacy_row(data, product: ET.Element, color_node: ET.Element | None) -
         "products__product__eraser": property_text(product, "Eraser"),
         "products__product__tip": translation_it(data["translations"], pid, "Tip") or translation_it(data["translations"], pid, "Tip_Type"),
         "products__product__sheets": property_text(product, "Number_Of_Sheets"),
-        "products__product__gift_box": text(product, "Giftbox"),
+        "products__product__gift_box": product.text("Giftbox"),
         "products__product__paper_color": translation_it(data["translations"], pid, "Paper_Color"),
         "products__product__refillable": property_text(product, "Replaceable_Refill"),
         "products__product__child_resistant": property_text(product, "Child_Resistant"),
         "products__product__controllable_flame": property_text(product, "Controllable_Flame"),
-        "products__product__custom": text(product, "Custom"),
+        "products__product__custom": product.text("Custom"),
         "products__product__outer_carton_printed_weight": logistic_attr(product, "outbound_printed_carton_weight", "Outbound_Printed_Carton_Weight") or logistic_text(product, "Outbound_Printed_Carton_Weight"),
         "products__product__outer_carton_printed_length": logistic_attr(product, "outbound_printed_carton_length", "Outbound_Printed_Carton_Length"),
         "products__product__outer_carton_printed_width": logistic_attr(product, "outbound_printed_carton_width", "Outbound_Printed_Carton_Width"),
         "products__product__outer_carton_printed_height": logistic_attr(product, "outbound_printed_carton_height", "Outbound_Printed_Carton_Height"),
         "products__product__outer_carton_unprinted_quantity": logistic_text(product, "Outbound_Unprinted_Pcs_Per_Carton"),
-        "products__product__metal_parts": text(product, "Metal_Parts"),
+        "products__product__metal_parts": product.text("Metal_Parts"),
         "products__product__outer_carton_unprinted_length": logistic_attr(product, "outbound_unprinted_carton_length", "Outbound_Unprinted_Carton_Length"),
         "products__product__outer_carton_unprinted_width": logistic_attr(product, "outbound_unprinted_carton_width", "Outbound_Unprinted_Carton_Width"),
         "products__product__outer_carton_unprinted_height": logistic_attr(product, "outbound_unprinted_carton_height", "Outbound_Unprinted_Carton_Height"),
-        "products__product__toppoint_design": text(product, "Toppoint_Design"),
+        "products__product__toppoint_design": product.text("Toppoint_Design"),
         "products__product__double_wall": property_text(product, "Double_Wall"),
         "products__product__dishwasher_resistant": translation_it(data["translations"], pid, "Dishwasher_Resistant") or yes_no(property_text(product, "Dishwasher_Safe")),
         "products__product__microwave_safe": translation_it(data["translations"], pid, "Microwave_Safe") or translation_it(data["translations"], pid, "Microwave_Safe_New"),
@@ -568,7 +884,7 @@ def build_legacy_row(data, product: ET.Element, color_node: ET.Element | None) -
         "products__product__outer_carton_unprinted_weight": logistic_attr(product, "outbound_unprinted_carton_weight", "Outbound_Unprinted_Carton_Weight") or logistic_text(product, "Outbound_Unprinted_Carton_Weight"),
         "products__product__hs_code": sustainability(product, "Hs_Code"),
         "products__product__country_origin": sustainability(product, "Country_Origin"),
-        "products__product__brands": text(product, "Brand"),
+        "products__product__brands": product.text("Brand"),
         "products__product__it_name": translation_it(data["translations"], pid, "title"),
         "products__product__it_description": translation_it(data["translations"], pid, "description"),
         "products__product__it_keywords": translation_it(data["translations"], pid, "search_term"),
@@ -612,13 +928,13 @@ def build_products(data, destination: Path) -> dict:
         category_columns.update(f"v4_category__{key}" for key in flat)
 
     for product in data["products"]:
-        pid = text(product, "Product_Id")
-        flat = flatten(product, "Product", skip_direct={"Colors"})
+        pid = product.pid
+        flat = product.flat
         product_flat_cache[pid] = flat
         v4_columns.update(f"v4__{key}" for key in flat)
         translation = data["translations"].get(pid)
         if translation is not None:
-            it_flat = flatten_it_translation(translation)
+            it_flat = translation.it_flat
             translation_flat_cache[pid] = it_flat
             it_columns.update(f"v4_it__{key[9:] if key.startswith('product__') else key}" for key in it_flat)
 
@@ -637,31 +953,28 @@ def build_products(data, destination: Path) -> dict:
         + price_columns
     )
 
-    rows = []
+    rows = ColumnStore()
     for product in data["products"]:
-        pid = text(product, "Product_Id")
-        colors_node = product.find("Colors")
-        variants = colors_node.findall("Color") if colors_node is not None else []
-        if not variants:
-            variants = [None]
+        pid = product.pid
+        variants = product.colors or [None]
 
-        category_ids = [text(node, ".") for node in product.findall("./Categories/Category_Id")]
         category_aggregate: dict[str, list[str]] = defaultdict(list)
-        for cid in category_ids:
+        for cid in product.category_ids:
             for key, value in data["category_flat"].get(cid, {}).items():
                 category_aggregate[key].append(value)
         category_aggregate = {key: unique_join(values, ", ") for key, values in category_aggregate.items()}
+        aggregate = position_aggregate(data, pid)
 
         for variant in variants:
-            row = build_legacy_row(data, product, variant)
-            raw_color = variant.attrib.get("id", "") if variant is not None else ""
+            row = build_legacy_row(data, product, variant, aggregate)
+            raw_color = variant["id"] if variant is not None else ""
             compatibility_color = raw_color or "N0999"
 
             for key, value in product_flat_cache[pid].items():
                 row[f"v4__{key}"] = value
             row["v4__Color__@id"] = raw_color
-            row["v4__Color__EAN_Code"] = text(variant, "EAN_Code") if variant is not None else ""
-            row["v4__Color__Image_Color"] = text(variant, "Image_Color") if variant is not None else ""
+            row["v4__Color__EAN_Code"] = variant["EAN_Code"] if variant is not None else ""
+            row["v4__Color__Image_Color"] = variant["Image_Color"] if variant is not None else ""
 
             for key, value in data["color_flat"].get(compatibility_color, {}).items():
                 row[f"v4_color__{key}"] = value
@@ -678,12 +991,7 @@ def build_products(data, destination: Path) -> dict:
                     row[f"v4_price__tier_{index}__{field}"] = tier.get(field, "")
             rows.append(row)
 
-    destination.parent.mkdir(parents=True, exist_ok=True)
-    with destination.open("w", newline="", encoding="utf-8-sig") as handle:
-        writer = csv.DictWriter(handle, fieldnames=headers, extrasaction="ignore")
-        writer.writeheader()
-        writer.writerows(rows)
-
+    rows.write_csv(destination, headers)
     return {"rows": len(rows), "columns": len(headers), "path": str(destination)}
 
 
@@ -716,21 +1024,84 @@ def build_dpo(data, destination: Path) -> dict:
             DPO_HEADERS[5]: "",
         })
 
-    destination.parent.mkdir(parents=True, exist_ok=True)
-    with destination.open("w", newline="", encoding="utf-8-sig") as handle:
-        writer = csv.DictWriter(handle, fieldnames=DPO_HEADERS)
-        writer.writeheader()
-        writer.writerows(rows)
+    write_rows(destination, DPO_HEADERS, rows)
     return {"rows": len(rows), "columns": len(DPO_HEADERS), "path": str(destination)}
 
 
+def report_peak_memory(stage: str) -> None:
+    if resource is None:
+        return
+    # ru_maxrss è in KiB su Linux; i figli sono i processi di load_indexes e degli export.
+    # Il picco dopo load_indexes misura gli indici da soli, prima di righe ed export.
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    print(f"Memoria di picco {stage}: {own:.0f} MB (processi di lavoro: {children:.0f} MB)")
+
+
+_EXPORT_DATA = None
+# CPU share of one export worker; None outside an export pool.
+_EXPORT_BUDGET: int | None = None
+
+
+def _init_exports(data, budget: int) -> None:
+    global _EXPORT_DATA, _EXPORT_BUDGET
+    _EXPORT_DATA = data
+    _EXPORT_BUDGET = budget
+
+
+def export_budget(workers: int) -> int:
+    """``workers`` capped to the CPU share of the current export worker.
+
+    A builder that opens its own pool (the clean Products.csv shards) calls
+    this, so concurrent exports split the CPUs instead of each forking
+    ``TOPPOINT_BUILD_WORKERS`` processes with a copy of the indexes.
+    """
+    return workers if _EXPORT_BUDGET is None else max(1, min(workers, _EXPORT_BUDGET))
+
+
+def run_export(builder, destination: Path, data=None) -> dict:
+    started = time.perf_counter()
+    result = builder(_EXPORT_DATA if data is None else data, destination)
+    result["seconds"] = round(time.perf_counter() - started, 2)
+    return result
+
+
+def run_exports(data, output_dir: Path, exports: dict) -> dict:
+    """Build every export of ``exports`` (name -> (file name, builder)) from the same indexes.
+
+    The builders only read ``data`` and write their own file, so each one runs
+    as a separate pool task; the indexes reach the workers once through the
+    pool initializer together with their share of the CPUs (see
+    ``export_budget``). Exports are submitted in registry order, so list the
+    slowest first. Each result gains its build time in ``seconds``.
+    """
+    workers = min(EXPORT_WORKERS, len(exports))
+    if workers <= 1:
+        return {name: run_export(builder, output_dir / filename, data) for name, (filename, builder) in exports.items()}
+    budget = max(1, (os.cpu_count() or 1) // workers)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_exports, initargs=(data, budget)) as pool:
+        futures = {
+            name: pool.submit(run_export, builder, output_dir / filename)
+            for name, (filename, builder) in exports.items()
+        }
+        return {name: future.result() for name, future in futures.items()}
+
+
+EXPORTS = {
+    "products": ("Products.csv", build_products),
+    "dpo_print": ("DPO PRINT.csv", build_dpo),
+}
+
+
 def build_from_source_root(source_root: Path, output_dir: Path) -> dict:
     data = load_indexes(source_root)
-    products = build_products(data, output_dir / "Products.csv")
-    dpo = build_dpo(data, output_dir / "DPO PRINT.csv")
-    print(f"Products: {products['rows']} righe, {products['columns']} colonne")
-    print(f"DPO PRINT: {dpo['rows']} righe")
-    return {"products": products, "dpo_print": dpo}
+    report_peak_memory("dopo load_indexes")
+    result = run_exports(data, output_dir, EXPORTS)
+    products, dpo = result["products"], result["dpo_print"]
+    print(f"Products: {products['rows']} righe, {products['columns']} colonne ({products['seconds']}s)")
+    print(f"DPO PRINT: {dpo['rows']} righe ({dpo['seconds']}s)")
+    report_peak_memory("a fine build")
+    return result
 
 
 if __name__ == "__main__":
@@ -1,12 +1,19 @@
 from __future__ import annotations
 
-import csv
+import hashlib
+import os
 import re
+import sys
 import xml.etree.ElementTree as ET
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 
 import build_exports as base
+from column_store import EMPTY, ColumnStore
+from csv_writer import write_rows
+from feed_cache import RowCache
 
 LEGACY_HEADERS = base.LEGACY_HEADERS
 DPO_HEADERS = base.DPO_HEADERS
@@ -14,6 +21,14 @@ DPO_HEADERS = base.DPO_HEADERS
 LANG_PREFIXES = ("DA_", "DE_", "EN_", "ES_", "FI_", "FR_", "NL_", "NO_", "PL_", "SE_", "PT_")
 TRUE_VALUES = {"1", "true", "yes", "y"}
 FALSE_VALUES = {"0", "false", "no", "n"}
+# Processi per la costruzione delle righe di Products.csv (1 = nel processo principale).
+BUILD_WORKERS = int(os.getenv("TOPPOINT_BUILD_WORKERS", "0")) or os.cpu_count() or 1
+SHARDS_PER_WORKER = 4
+MIN_PRODUCTS_PER_WORKER = 200
+# Righe già costruite per prodotto in <cache>/rows, riusate se i frammenti sorgente non cambiano.
+ROW_CACHE = os.getenv("TOPPOINT_ROW_CACHE", "1") != "0"
+# Segnaposto per ``created`` nelle righe in cache: il NUL non compare nel testo XML.
+CREATED_MARK = "\0created\0"
 NUMERIC_HINTS = re.compile(
     r"(?:^|__|_)(?:id|code|ean|hs|rgb|price|start|end|minimum|maximum|quantity|qty|"
     r"number|count|pcs|weight|length|width|height|diameter|volume|capacity|mah|time|day|days|"
@@ -21,6 +36,7 @@ NUMERIC_HINTS = re.compile(
 )
 
 
+@lru_cache(maxsize=None)
 def norm(value: str) -> str:
     return re.sub(r"[^a-z0-9]", "", (value or "").lower())
 
@@ -30,34 +46,46 @@ LEGACY_DIRECT = {
     for h in LEGACY_HEADERS
     if h.startswith("products__product__") and "__" not in h[len("products__product__"):]
 }
+# Legacy header -> normalised supplier tag it is filled from by exact name.
+LEGACY_NORM = {
+    h: norm(h[len("products__product__"):])
+    for h in LEGACY_HEADERS
+    if h.startswith("products__product__") and "__" not in h[len("products__product__"):]
+}
 
 
 def direct_dict(elem: ET.Element | None) -> dict[str, str]:
     if elem is None:
         return {}
-    return {c.tag: (c.text or "").strip() for c in list(elem) if not list(c)}
+    return {c.tag: sys.intern((c.text or "").strip()) for c in list(elem) if not list(c)}
 
 
-def direct_exact(elem: ET.Element | None, legacy_header: str) -> str:
-    if elem is None or not legacy_header.startswith("products__product__"):
-        return ""
-    suffix = legacy_header[len("products__product__"):]
-    if "__" in suffix:
-        return ""
-    wanted = norm(suffix)
+def leaf_fields(elem: ET.Element) -> dict[str, str]:
+    """Leaf children in document order; the first occurrence of a tag wins, as with ``find``."""
+    fields: dict[str, str] = {}
     for child in list(elem):
-        if not list(child) and norm(child.tag) == wanted:
-            return (child.text or "").strip()
-    return ""
+        if not list(child):
+            fields.setdefault(child.tag, sys.intern((child.text or "").strip()))
+    return fields
+
+
+def norm_fields(fields: dict[str, str] | None) -> dict[str, str]:
+    """Leaf fields keyed by ``norm(tag)``; the first tag with a given normal form wins."""
+    out: dict[str, str] = {}
+    for tag, value in (fields or {}).items():
+        out.setdefault(norm(tag), value)
+    return out
+
+
+def direct_exact(fields: dict[str, str], legacy_header: str) -> str:
+    """Value of the supplier field with the legacy header's exact name (``fields`` from norm_fields)."""
+    wanted = LEGACY_NORM.get(legacy_header)
+    return fields.get(wanted, "") if wanted is not None else ""
 
 
 def load_print(path: Path):
-    root = ET.parse(path).getroot()
     rows, by_product = [], defaultdict(list)
-    products = root.find("Products")
-    if products is None:
-        return rows, by_product
-    for product in products.findall("Product"):
+    for product in base.iter_records(path, "Products/Product"):
         pid = base.text(product, "Product_Code")
         positions = product.find("Positions")
         if positions is None:
@@ -70,63 +98,58 @@ def load_print(path: Path):
     return rows, by_product
 
 
-def load_indexes(source_root: Path):
-    data = base.load_indexes(source_root)
-    v3 = source_root / "feed-v3"
-
-    root = ET.parse(v3 / "Products_v3.xml").getroot()
-    data["products_v3"], data["v3_rows_by_pid"] = {}, defaultdict(list)
-    for node in root.find("Products").findall("Product"):
+def load_products_v3(path: Path):
+    products_v3, rows_by_pid = {}, defaultdict(list)
+    for node in base.iter_records(path, "Products/Product"):
         pid, color = base.text(node, "Product_Id"), base.text(node, "Color_Code")
-        data["products_v3"][(pid, color)] = node
-        data["v3_rows_by_pid"][pid].append(node)
+        fields = leaf_fields(node)
+        products_v3[(pid, color)] = fields
+        rows_by_pid[pid].append(fields)
+    return products_v3, rows_by_pid
+
 
-    colors_root = ET.parse(v3 / "colors.xml").getroot()
-    data["colors_v3"] = {
+def load_colors_v3(path: Path):
+    return {
         (base.text(node, "Product_id"), base.text(node, "Color_Code")): direct_dict(node)
-        for node in colors_root.find("Colors").findall("Color")
+        for node in base.iter_records(path, "Colors/Color")
     }
 
-    cats_root = ET.parse(v3 / "categories.xml").getroot()
-    data["categories_v3"] = {
+
+def load_categories_v3(path: Path):
+    return {
         base.text(node, "Category_Id"): direct_dict(node)
-        for node in cats_root.find("Categories").findall("Category")
+        for node in base.iter_records(path, "Categories/Category")
     }
 
-    trans_root = ET.parse(v3 / "ProductTranslations_v3.xml").getroot()
-    data["translations_v3"] = {base.text(n, "code"): n for n in trans_root.findall("product")}
 
-    data["print_v3_rows"], data["print_v3_by_product"] = load_print(v3 / "Print_v3.xml")
-    pos_root = ET.parse(v3 / "PositionTranslations_v3.xml").getroot()
-    data["position_it_v3"] = {
+def load_position_titles_v3(path: Path):
+    return {
         base.text(n, "Position"): base.text(n, "IT_Position_Title")
-        for n in pos_root.findall("Position")
+        for n in base.iter_records(path, "Position")
     }
-    return data
 
 
-def actual_variants(data, product: ET.Element):
-    pid = base.text(product, "Product_Id")
-    colors = product.find("Colors")
-    variants = colors.findall("Color") if colors is not None else []
-    if variants:
-        return [(node.attrib.get("id", ""), node) for node in variants]
-    # No invented compatibility color: take the actual maintained V3 row(s).
-    return [(base.text(node, "Color_Code"), None) for node in data["v3_rows_by_pid"].get(pid, [])]
+def loader_tasks(source_root: Path):
+    v3 = source_root / "feed-v3"
+    return base.loader_tasks(source_root) + [
+        (load_products_v3, v3 / "Products_v3.xml", ("products_v3", "v3_rows_by_pid")),
+        (load_colors_v3, v3 / "colors.xml", "colors_v3"),
+        (load_categories_v3, v3 / "categories.xml", "categories_v3"),
+        (base.load_translations, v3 / "ProductTranslations_v3.xml", "translations_v3"),
+        (load_print, v3 / "Print_v3.xml", ("print_v3_rows", "print_v3_by_product")),
+        (load_position_titles_v3, v3 / "PositionTranslations_v3.xml", "position_it_v3"),
+    ]
 
 
-def v4_direct_override(product: ET.Element, header: str) -> str:
-    """Use V4 only when the supplier exposes the same field name directly."""
-    if not header.startswith("products__product__"):
-        return ""
-    suffix = header[len("products__product__"):]
-    if "__" in suffix:
-        return ""
-    wanted = norm(suffix)
-    for child in list(product):
-        if not list(child) and norm(child.tag) == wanted:
-            return (child.text or "").strip()
-    return ""
+def load_indexes(source_root: Path):
+    return base.load_tasks(loader_tasks(source_root))
+
+
+def actual_variants(data, product: base.ProductRecord):
+    if product.colors:
+        return [(color["id"], color) for color in product.colors]
+    # No invented compatibility color: take the actual maintained V3 row(s).
+    return [(fields.get("Color_Code", ""), None) for fields in data["v3_rows_by_pid"].get(product.pid, [])]
 
 
 def print_aggregate(rows: list[dict[str, str]]) -> dict[str, str]:
@@ -195,10 +218,17 @@ def keep_it_and_neutral(flat: dict[str, str]):
     return out
 
 
-def build_legacy_row(data, product: ET.Element, color_code: str, color_node: ET.Element | None):
-    pid = base.text(product, "Product_Id")
-    v3 = data["products_v3"].get((pid, color_code))
-    row = {header: "" for header in LEGACY_HEADERS}
+def print_aggregates(data, pid: str):
+    """V4 and V3 print aggregates plus the V3 method/time helper, shared by all variants."""
+    p3rows = data["print_v3_by_product"].get(pid, [])
+    return print_aggregate(data["prints_by_product"].get(pid, [])), print_aggregate(p3rows), v3_method_time(p3rows)
+
+
+def build_legacy_row(data, product: base.ProductRecord, color_code: str, color: dict[str, str] | None, prints=None):
+    pid = product.pid
+    v3 = norm_fields(data["products_v3"].get((pid, color_code)))
+    v4 = norm_fields(product.leaves)
+    row = dict.fromkeys(LEGACY_HEADERS, "")
 
     # Exact maintained V3 fields are the safe compatibility baseline.
     for header in LEGACY_HEADERS:
@@ -210,34 +240,29 @@ def build_legacy_row(data, product: ET.Element, color_code: str, color_node: ET.
 
     # V4 is primary only for exact same-named direct fields.
     for header in LEGACY_HEADERS:
-        value = v4_direct_override(product, header)
+        value = direct_exact(v4, header)
         if value:
             row[header] = value
 
     # V4 structures that are clearly the same legacy supplier fields.
-    log = product.find("Logistic_Information")
-    sust = product.find("Sustainability_Compliance")
-    pinfo = product.find("Print_Information")
-    props = product.find("Product_Properties")
-
     exact_nested = {
-        "products__product__dangerous_goods": base.text(log, "Dangerous_Goods"),
-        "products__product__breaking_risk": base.text(log, "Breaking_Risk"),
-        "products__product__hs_code": base.text(sust, "Hs_Code"),
-        "products__product__country_origin": base.text(sust, "Country_Origin"),
-        "products__product__minimum_start": base.text(pinfo, "Minimum_Start"),
-        "products__product__print_group": base.text(pinfo, "Print_Group"),
-        "products__product__print_method": base.text(pinfo, "Print_Method"),
-        "products__product__print_size": base.text(pinfo, "Print_Size"),
-        "products__product__print_maximum_colors": base.text(pinfo, "Print_Maximum_Colors"),
-        "products__product__print_positions": base.text(pinfo, "Print_Positions"),
-        "products__product__handling_code": base.text(pinfo, "Handling_Code"),
-        "products__product__mechanical": base.text(props, "Mechanical"),
-        "products__product__eraser": base.text(props, "Eraser"),
-        "products__product__double_wall": base.text(props, "Double_Wall"),
-        "products__product__bluetooth": base.text(props, "Bluetooth"),
-        "products__product__child_resistant": base.text(props, "Child_Resistant"),
-        "products__product__controllable_flame": base.text(props, "Controllable_Flame"),
+        "products__product__dangerous_goods": base.logistic_text(product, "Dangerous_Goods"),
+        "products__product__breaking_risk": base.logistic_text(product, "Breaking_Risk"),
+        "products__product__hs_code": base.sustainability(product, "Hs_Code"),
+        "products__product__country_origin": base.sustainability(product, "Country_Origin"),
+        "products__product__minimum_start": base.print_text(product, "Minimum_Start"),
+        "products__product__print_group": base.print_text(product, "Print_Group"),
+        "products__product__print_method": base.print_text(product, "Print_Method"),
+        "products__product__print_size": base.print_text(product, "Print_Size"),
+        "products__product__print_maximum_colors": base.print_text(product, "Print_Maximum_Colors"),
+        "products__product__print_positions": base.print_text(product, "Print_Positions"),
+        "products__product__handling_code": base.print_text(product, "Handling_Code"),
+        "products__product__mechanical": base.property_text(product, "Mechanical"),
+        "products__product__eraser": base.property_text(product, "Eraser"),
+        "products__product__double_wall": base.property_text(product, "Double_Wall"),
+        "products__product__bluetooth": base.property_text(product, "Bluetooth"),
+        "products__product__child_resistant": base.property_text(product, "Child_Resistant"),
+        "products__product__controllable_flame": base.property_text(product, "Controllable_Flame"),
     }
     for header, value in exact_nested.items():
         if value:
@@ -257,9 +282,8 @@ def build_legacy_row(data, product: ET.Element, color_code: str, color_node: ET.
             row[header] = value
 
     weight = base.attr(product, "ProductWeight", "Weight")
-    weight_node = product.find("ProductWeight")
     if weight:
-        if weight_node is not None and weight_node.attrib.get("unit", "").lower() == "kg":
+        if base.attr(product, "ProductWeight", "unit").lower() == "kg":
             try:
                 weight = f"{float(weight) * 1000:g}"
             except ValueError:
@@ -267,15 +291,9 @@ def build_legacy_row(data, product: ET.Element, color_code: str, color_node: ET.
         row["products__product__weight"] = weight
 
     # Optional print values: direct supplier list, no generated Yes/No.
-    if pinfo is not None:
-        optional = pinfo.find("Optional_Prints")
-        if optional is not None:
-            row["products__product__print_group_optional"] = base.smart_join(
-                base.text(n, "Optional_Print_Group") for n in optional.findall("Optional_print")
-            )
-            row["products__product__print_method_optional"] = base.smart_join(
-                base.text(n, "Optional_Print_Method") for n in optional.findall("Optional_print")
-            )
+    if product.optional_prints is not None:
+        row["products__product__print_group_optional"] = base.optional_prints(product, "Optional_Print_Group")
+        row["products__product__print_method_optional"] = base.optional_prints(product, "Optional_Print_Method")
 
     # Official Italian V4 translations. Exact V3 values remain fallback when absent.
     it_map = {
@@ -305,34 +323,26 @@ def build_legacy_row(data, product: ET.Element, color_code: str, color_node: ET.
     row["IT_Color_Base_Title"] = color_info.get("IT_Color_Base_Title", "") or color_v3.get("IT_Color_Base_Title", "")
     row["IT_Color_Base2_Title"] = color_info.get("IT_Color_Base2_Title", "") or color_v3.get("IT_Color_Base2_Title", "")
 
-    category_ids = [base.text(n, ".") for n in product.findall("./Categories/Category_Id")]
-    titles = [data["categories"].get(cid, {}).get("IT_Description", "") for cid in category_ids]
+    titles = [data["categories"].get(cid, {}).get("IT_Description", "") for cid in product.category_ids]
     titles = [x for x in titles if x]
     if titles:
         row["categories"] = base.unique_join(titles)
 
     # Variant/product values that live in dedicated V4 nodes.
-    if color_node is not None:
-        image = base.text(color_node, "Image_Color")
-        if image:
-            row["products__product__image_color"] = image
-    comp = [base.text(n, ".") for n in product.findall("./Complementary_Products/Product_Id")]
-    if comp:
-        row["products__product__complementary_products__product_id"] = base.unique_join(comp)
-    colors_node = product.find("Colors")
-    if colors_node is not None:
-        color_ids = [n.attrib.get("id", "") for n in colors_node.findall("Color") if n.attrib.get("id", "")]
-        if color_ids:
-            row["products__product__colors"] = base.smart_join(color_ids, ", ")
+    if color is not None and color["Image_Color"]:
+        row["products__product__image_color"] = color["Image_Color"]
+    if product.complementary:
+        row["products__product__complementary_products__product_id"] = base.unique_join(product.complementary)
+    color_ids = [variant["id"] for variant in product.colors if variant["id"]]
+    if color_ids:
+        row["products__product__colors"] = base.smart_join(color_ids, ", ")
 
     price = first_price(data, pid, color_code)
     if price:
         row["products__product__prices__price__price"] = price
 
     # Print V4 is primary; fields removed from V4 come from maintained Print V3.
-    p4 = print_aggregate(data["prints_by_product"].get(pid, []))
-    p3rows = data["print_v3_by_product"].get(pid, [])
-    p3 = print_aggregate(p3rows)
+    p4, p3, method_time = prints if prints is not None else print_aggregates(data, pid)
     position_headers = {
         "products__product__positions__position__print_group": p4["print_group"],
         "products__product__positions__position__print_method": p4["print_method"],
@@ -358,7 +368,7 @@ def build_legacy_row(data, product: ET.Element, color_code: str, color_node: ET.
     # Helper columns are deterministic formatting of supplier values only.
     row["dimensions"] = p4["dimensions"]
     row["print_method_quantity"] = p4["method_qty"]
-    row["print_method_time"] = v3_method_time(p3rows)
+    row["print_method_time"] = method_time
     if row.get("products__product__minimum"):
         row["product_minimum"] = f"{row['products__product__minimum']}minimo"
     images = data["images"].get(f"{pid}-{color_code}", [])
@@ -389,33 +399,24 @@ def semantic_legacy_for_candidate(candidate: str) -> str | None:
     return explicit.get(candidate)
 
 
-def booleanize(rows, headers):
+def booleanize(rows: ColumnStore, headers):
     bool_headers = set()
     for header in headers:
         if NUMERIC_HINTS.search(header):
             continue
-        values = {str(r.get(header, "")).strip().lower() for r in rows if str(r.get(header, "")).strip()}
-        if values and values.issubset(TRUE_VALUES | FALSE_VALUES):
-            bool_headers.add(header)
-    for row in rows:
-        for header in bool_headers:
-            value = str(row.get(header, "")).strip().lower()
-            if value in TRUE_VALUES:
-                row[header] = "Sì"
-            elif value in FALSE_VALUES:
-                row[header] = "No"
+        profile = rows.profile(header)
+        if not profile.boolean:
+            continue
+        bool_headers.add(header)
+        values = profile.distinct or set(rows.column(header))
+        mapping = {value: "Sì" if value.strip().lower() in TRUE_VALUES else "No" for value in values if value.strip()}
+        rows.rewrite(header, mapping)
     return bool_headers
 
 
-def build_products(data, destination: Path):
+def product_rows(data, product: base.ProductRecord):
+    """Rows of one product plus the candidate columns they set, in first-seen order."""
     rows, candidates, candidate_seen = [], [], set()
-    product_flat, it_flat = {}, {}
-
-    for product in data["products"]:
-        pid = base.text(product, "Product_Id")
-        product_flat[pid] = base.flatten(product, "Product", skip_direct={"Colors"})
-        trans = data["translations"].get(pid)
-        it_flat[pid] = base.flatten_it_translation(trans) if trans is not None else {}
 
     def add(row, key, value):
         row[key] = value
@@ -423,37 +424,211 @@ def build_products(data, destination: Path):
             candidate_seen.add(key)
             candidates.append(key)
 
-    for product in data["products"]:
-        pid = base.text(product, "Product_Id")
-        category_ids = [base.text(n, ".") for n in product.findall("./Categories/Category_Id")]
-        category_agg = defaultdict(list)
-        for cid in category_ids:
-            for key, value in keep_it_and_neutral(data["category_flat"].get(cid, {})).items():
-                category_agg[key].append(value)
-
-        for color_code, color_node in actual_variants(data, product):
-            row = build_legacy_row(data, product, color_code, color_node)
-
-            for key, value in product_flat[pid].items():
-                add(row, f"v4__{key}", value)
-            add(row, "v4__Color__@id", color_code)
-            add(row, "v4__Color__EAN_Code", base.text(color_node, "EAN_Code") if color_node is not None else "")
-            add(row, "v4__Color__Image_Color", base.text(color_node, "Image_Color") if color_node is not None else "")
-
-            for key, value in keep_it_and_neutral(data["color_flat"].get(color_code, {})).items():
-                add(row, f"v4_color__{key}", value)
-            for key, values in category_agg.items():
-                add(row, f"v4_category__{key}", base.unique_join(values, ", "))
-            for key, value in it_flat[pid].items():
-                clean = key[9:] if key.startswith("product__") else key
-                add(row, f"v4_it__{clean}", value)
-
-            price = data["prices"].get((pid, color_code), {})
-            add(row, "v4_price__Excluded_From_Discount", price.get("excluded", ""))
-            for i, tier in enumerate(price.get("tiers", []), 1):
-                for field in ("Start", "End", "Price"):
-                    add(row, f"v4_price__tier_{i}__{field}", tier.get(field, ""))
-            rows.append(row)
+    pid = product.pid
+    trans = data["translations"].get(pid)
+    it_flat = trans.it_flat if trans is not None else {}
+    category_agg = defaultdict(list)
+    for cid in product.category_ids:
+        for key, value in keep_it_and_neutral(data["category_flat"].get(cid, {})).items():
+            category_agg[key].append(value)
+    category_agg = {key: base.unique_join(values, ", ") for key, values in category_agg.items()}
+    prints = print_aggregates(data, pid)
+
+    for color_code, color in actual_variants(data, product):
+        row = build_legacy_row(data, product, color_code, color, prints)
+
+        for key, value in product.flat.items():
+            add(row, f"v4__{key}", value)
+        add(row, "v4__Color__@id", color_code)
+        add(row, "v4__Color__EAN_Code", color["EAN_Code"] if color is not None else "")
+        add(row, "v4__Color__Image_Color", color["Image_Color"] if color is not None else "")
+
+        for key, value in keep_it_and_neutral(data["color_flat"].get(color_code, {})).items():
+            add(row, f"v4_color__{key}", value)
+        for key, value in category_agg.items():
+            add(row, f"v4_category__{key}", value)
+        for key, value in it_flat.items():
+            clean = key[9:] if key.startswith("product__") else key
+            add(row, f"v4_it__{clean}", value)
+
+        price = data["prices"].get((pid, color_code), {})
+        add(row, "v4_price__Excluded_From_Discount", price.get("excluded", ""))
+        for i, tier in enumerate(price.get("tiers", []), 1):
+            for field in ("Start", "End", "Price"):
+                add(row, f"v4_price__tier_{i}__{field}", tier.get(field, ""))
+        rows.append(row)
+    return rows, candidates
+
+
+class RowMerger:
+    """Collects per-product results in product order into one ColumnStore.
+
+    Candidate columns are unioned in the order they arrive, which reproduces
+    the first-seen order of a single pass over all products.
+    """
+
+    def __init__(self):
+        self.rows = ColumnStore(boolean_values=TRUE_VALUES | FALSE_VALUES)
+        self.candidates: list[str] = []
+        self.seen: set[str] = set()
+
+    def add_candidates(self, candidates) -> None:
+        for key in candidates:
+            if key not in self.seen:
+                self.seen.add(key)
+                self.candidates.append(key)
+
+    def add_product(self, rows, candidates) -> None:
+        for row in rows:
+            self.rows.append(row)
+        self.add_candidates(candidates)
+
+    def add_packed(self, headers, values, candidates) -> None:
+        for row in values:
+            self.rows.append_values(headers, row)
+        self.add_candidates(candidates)
+
+
+def packed_rows(data, product: base.ProductRecord):
+    """``product_rows`` as one header tuple plus a value tuple per row, the row cache's form.
+
+    A header missing from a row gets ``EMPTY``, which is what ``ColumnStore``
+    pads it with anyway.
+    """
+    rows, candidates = product_rows(data, product)
+    headers = tuple({header: None for row in rows for header in row})
+    return headers, [tuple(row.get(header, EMPTY) for header in headers) for row in rows], tuple(candidates)
+
+
+def build_rows(data, products):
+    """Rows for ``products`` plus the candidate columns in first-seen order."""
+    merger = RowMerger()
+    for product in products:
+        merger.add_product(*product_rows(data, product))
+    return merger.rows, merger.candidates
+
+
+_SHARD_DATA = None
+
+
+def _init_shard(data) -> None:
+    global _SHARD_DATA
+    _SHARD_DATA = data
+
+
+def _build_shard(start: int, stop: int):
+    return build_rows(_SHARD_DATA, _SHARD_DATA["products"][start:stop])
+
+
+def _product_shard(indexes: list[int]):
+    products = _SHARD_DATA["products"]
+    return [packed_rows(_SHARD_DATA, products[index]) for index in indexes]
+
+
+def shard_pool(data, workers: int) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_shard, initargs=(data,))
+
+
+def sharded_rows(data):
+    """``build_rows`` over all products, split into contiguous shards across processes.
+
+    Workers get the indexes once through the pool initializer (inherited, not
+    pickled, with fork) and return their own ColumnStore and candidate list.
+    Shards are merged in product order and candidates keep their first-seen
+    order, so the result is the same as a single ``build_rows`` call.
+    """
+    products = data["products"]
+    workers = min(base.export_budget(BUILD_WORKERS), len(products))
+    if workers <= 1:
+        return build_rows(data, products)
+
+    size = -(-len(products) // (workers * SHARDS_PER_WORKER))
+    starts = range(0, len(products), size)
+    merger = RowMerger()
+    with shard_pool(data, workers) as pool:
+        for shard_rows, shard_candidates in pool.map(_build_shard, starts, [start + size for start in starts]):
+            merger.rows.extend(shard_rows)
+            merger.add_candidates(shard_candidates)
+    return merger.rows, merger.candidates
+
+
+def product_fragments(data, product: base.ProductRecord) -> tuple:
+    """Everything ``product_rows`` reads for ``product``, except the feed's ``created``."""
+    pid = product.pid
+    translation = data["translations"].get(pid)
+    codes = [code for code, _ in actual_variants(data, product)]
+    return (
+        [getattr(product, name) for name in base.ProductRecord.__slots__],
+        None if translation is None else [getattr(translation, name) for name in base.TranslationRecord.__slots__],
+        data["v3_rows_by_pid"].get(pid),
+        data["prints_by_product"].get(pid),
+        data["print_v3_by_product"].get(pid),
+        [
+            (
+                data["products_v3"].get((pid, code)),
+                data["colors"].get(code),
+                data["color_flat"].get(code),
+                data["colors_v3"].get((pid, code)),
+                data["prices"].get((pid, code)),
+                data["images"].get(f"{pid}-{code}"),
+            )
+            for code in codes
+        ],
+        [(data["categories"].get(cid), data["category_flat"].get(cid)) for cid in product.category_ids],
+    )
+
+
+def fragment_digest(data, product: base.ProductRecord) -> bytes:
+    # repr, not pickle: the text only depends on the values, not on which
+    # strings happen to be shared objects after a snapshot load.
+    return hashlib.blake2b(repr(product_fragments(data, product)).encode("utf-8"), digest_size=16).digest()
+
+
+def cached_rows(data, cache: RowCache):
+    """Rows from the per-product cache, rebuilding only products whose fragments changed.
+
+    Rows are built and cached with ``CREATED_MARK`` in place of the feed's
+    ``created`` timestamp, which changes every week; the merge fills it in.
+    Entries are ``packed_rows`` tuples whose header and candidate tuples are
+    shared between products, so the cache costs about one pointer per cell
+    on top of the ColumnStore, and is dropped once the rows are merged.
+    """
+    products = data["products"]
+    digests = [fragment_digest(data, product) for product in products]
+    entries = cache.load()
+    missing = [index for index, digest in enumerate(digests) if digest not in entries]
+
+    marked = {**data, "created": CREATED_MARK}
+    workers = min(base.export_budget(BUILD_WORKERS), len(missing) // MIN_PRODUCTS_PER_WORKER)
+    if workers > 1:
+        size = -(-len(missing) // (workers * SHARDS_PER_WORKER))
+        chunks = [missing[start:start + size] for start in range(0, len(missing), size)]
+        with shard_pool(marked, workers) as pool:
+            built = [result for results in pool.map(_product_shard, chunks) for result in results]
+    else:
+        built = [packed_rows(marked, products[index]) for index in missing]
+    shared: dict[tuple, tuple] = {}
+    for digest, (headers, values, candidates) in zip((digests[index] for index in missing), built):
+        entries[digest] = (shared.setdefault(headers, headers), values, shared.setdefault(candidates, candidates))
+    del built
+
+    if missing or len(entries) != len(set(digests)):
+        entries = {digest: entries[digest] for digest in digests}
+        cache.store(entries)
+
+    merger = RowMerger()
+    for digest in digests:
+        merger.add_packed(*entries[digest])
+    del entries
+    created = merger.rows.column("created")
+    created[:] = [data["created"] if value == CREATED_MARK else value for value in created]
+
+    print(f"Righe Products.csv: {len(products) - len(missing)} prodotti dalla cache, {len(missing)} ricostruiti")
+    return merger.rows, merger.candidates
+
+
+def build_products(data, destination: Path):
+    rows, candidates = cached_rows(data, RowCache()) if ROW_CACHE else sharded_rows(data)
 
     boolean_headers = booleanize(rows, LEGACY_HEADERS + candidates)
 
@@ -469,22 +644,42 @@ def build_products(data, destination: Path):
             filtered.append(candidate)
 
     # Then remove remaining exact duplicate value vectors without guessing semantics.
-    seen = {tuple(str(r.get(h, "")).strip() for r in rows): h for h in LEGACY_HEADERS}
+    # Columns are bucketed by their profile signature; digests are computed only
+    # inside a shared bucket and values are compared only when digests match.
+    seen: dict[tuple, list[str]] = {}
+    digests: dict[str, bytes] = {}
+
+    def digest(header):
+        if header not in digests:
+            digests[header] = rows.digest(header)
+        return digests[header]
+
+    def duplicate_of(header, bucket):
+        for index, other in enumerate(bucket):
+            if digest(header) == digest(other) and rows.same_values(header, other):
+                return index, other
+        return None
+
+    for header in LEGACY_HEADERS:
+        bucket = seen.setdefault(rows.signature(header), [])
+        match = duplicate_of(header, bucket)
+        if match is None:
+            bucket.append(header)
+        else:
+            bucket[match[0]] = header  # the last legacy header with these values is the reference
+
     kept, exact_dropped = [], []
     for candidate in filtered:
-        sig = tuple(str(r.get(candidate, "")).strip() for r in rows)
-        if sig in seen:
-            exact_dropped.append((candidate, seen[sig]))
+        bucket = seen.setdefault(rows.signature(candidate), [])
+        match = duplicate_of(candidate, bucket)
+        if match is not None:
+            exact_dropped.append((candidate, match[1]))
         else:
-            seen[sig] = candidate
+            bucket.append(candidate)
             kept.append(candidate)
 
     headers = LEGACY_HEADERS + kept
-    destination.parent.mkdir(parents=True, exist_ok=True)
-    with destination.open("w", newline="", encoding="utf-8-sig") as handle:
-        writer = csv.DictWriter(handle, fieldnames=headers, extrasaction="ignore")
-        writer.writeheader()
-        writer.writerows(rows)
+    rows.write_csv(destination, headers)
 
     return {
         "rows": len(rows),
@@ -493,6 +688,7 @@ def build_products(data, destination: Path):
         "boolean_columns": sorted(boolean_headers),
         "semantic_duplicate_columns": semantic_dropped,
         "exact_duplicate_columns": exact_dropped,
+        "column_profiles": {header: rows.profile(header).summary() for header in headers},
     }
 
 
@@ -525,20 +721,24 @@ def build_dpo(data, destination: Path):
             DPO_HEADERS[5]: "",
         })
 
-    destination.parent.mkdir(parents=True, exist_ok=True)
-    with destination.open("w", newline="", encoding="utf-8-sig") as handle:
-        writer = csv.DictWriter(handle, fieldnames=DPO_HEADERS)
-        writer.writeheader()
-        writer.writerows(rows)
+    write_rows(destination, DPO_HEADERS, rows)
     return {"rows": len(rows), "columns": len(DPO_HEADERS), "path": str(destination)}
 
 
+EXPORTS = {
+    "products": ("Products.csv", build_products),
+    "dpo_print": ("DPO PRINT.csv", build_dpo),
+}
+
+
 def build_from_source_root(source_root: Path, output_dir: Path):
     data = load_indexes(source_root)
-    products = build_products(data, output_dir / "Products.csv")
-    dpo = build_dpo(data, output_dir / "DPO PRINT.csv")
-    print(f"Products: {products['rows']} righe, {products['columns']} colonne")
-    print(f"DPO PRINT: {dpo['rows']} righe")
+    base.report_peak_memory("dopo load_indexes")
+    result = base.run_exports(data, output_dir, EXPORTS)
+    products, dpo = result["products"], result["dpo_print"]
+    print(f"Products: {products['rows']} righe, {products['columns']} colonne ({products['seconds']}s)")
+    print(f"DPO PRINT: {dpo['rows']} righe ({dpo['seconds']}s)")
     print(f"Alias semantici rimossi: {len(products['semantic_duplicate_columns'])}")
     print(f"Doppioni esatti rimossi: {len(products['exact_duplicate_columns'])}")
-    return {"products": products, "dpo_print": dpo}
+    base.report_peak_memory("a fine build")
+    return result
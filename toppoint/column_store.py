@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import hashlib
+import re
+from collections import Counter
+from pathlib import Path
+
+from csv_writer import write_columns
+
+EMPTY = ""
+DIGEST_CHUNK = 4096
+PROFILE_CAP = 64
+NUMBER = re.compile(r"[+-]?(?:\d+(?:[.,]\d+)?|[.,]\d+)")
+
+
+class ColumnProfile:
+    """Value statistics for one column, taken in a single counting sweep.
+
+    ``distinct`` keeps every raw value with its frequency while the column has
+    at most ``PROFILE_CAP`` of them and is ``None`` past the cap; ``stripped``
+    is the same for the stripped values, capped on its own count, so columns
+    differing only in whitespace get the same one. The flags are decided per
+    distinct value, so a column with a handful of values costs a handful of
+    checks however many rows it has.
+    """
+
+    __slots__ = ("empty", "distinct", "stripped", "boolean", "numeric")
+
+    def __init__(self, column: list[str], boolean_values: frozenset[str]):
+        counts = Counter(column)
+        stripped_counts: Counter[str] = Counter()
+        empty, boolean, numeric = 0, True, True
+        for value, count in counts.items():
+            stripped = value.strip()
+            stripped_counts[stripped] += count
+            if not stripped:
+                empty += count
+                continue
+            if boolean and stripped.lower() not in boolean_values:
+                boolean = False
+            if numeric and NUMBER.fullmatch(stripped) is None:
+                numeric = False
+        filled = len(column) > empty
+        self.empty = empty
+        self.distinct: dict[str, int] | None = counts if len(counts) <= PROFILE_CAP else None
+        self.stripped: dict[str, int] | None = stripped_counts if len(stripped_counts) <= PROFILE_CAP else None
+        self.boolean = filled and boolean
+        self.numeric = filled and numeric
+
+    def summary(self) -> dict:
+        return {
+            "empty": self.empty,
+            "distinct": None if self.distinct is None else len(self.distinct),
+            "boolean": self.boolean,
+            "numeric": self.numeric,
+        }
+
+
+class ColumnStore:
+    """Products.csv rows kept column by column.
+
+    Row builders still produce one dict per variant, but ``append`` moves its
+    values into per-header lists and drops the dict, so only one list slot
+    per cell stays alive. Columns are created on first use and padded with
+    the shared ``EMPTY`` string up to the current row count, which is what a
+    missing key means for ``csv.DictWriter``. Column-wide passes (boolean
+    detection, duplicate columns) read one list instead of probing every row,
+    and share the cached ``ColumnProfile`` of each column instead of scanning
+    it again on their own.
+    """
+
+    def __init__(self, boolean_values=()):
+        self.columns: dict[str, list[str]] = {}
+        self.profiles: dict[str, ColumnProfile] = {}
+        self.boolean_values = frozenset(boolean_values)
+        self.rows = 0
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def append(self, row: dict[str, str]) -> None:
+        self.append_values(row, row.values())
+
+    def append_values(self, headers, values) -> None:
+        """``append`` for a row given as ``headers`` plus the aligned ``values``."""
+        index = self.rows
+        columns = self.columns
+        for header, value in zip(headers, values):
+            column = columns.get(header)
+            if column is None:
+                column = columns[header] = [EMPTY] * index
+            elif len(column) < index:
+                column.extend([EMPTY] * (index - len(column)))
+            column.append(value)
+        self.rows = index + 1
+        if self.profiles:
+            self.profiles.clear()
+
+    def extend(self, other: ColumnStore) -> None:
+        """Append all rows of ``other`` after the current ones."""
+        for header in other.columns:
+            self.column(header).extend(other.column(header))
+        self.rows += other.rows
+        self.profiles.clear()
+
+    def column(self, header: str) -> list[str]:
+        """The full column for ``header`` (created empty if no row set it)."""
+        column = self.columns.get(header)
+        if column is None:
+            column = self.columns[header] = [EMPTY] * self.rows
+        elif len(column) < self.rows:
+            column.extend([EMPTY] * (self.rows - len(column)))
+        return column
+
+    def profile(self, header: str) -> ColumnProfile:
+        """Profile of ``header``, computed on first use and kept until the column changes."""
+        profile = self.profiles.get(header)
+        if profile is None:
+            profile = self.profiles[header] = ColumnProfile(self.column(header), self.boolean_values)
+        return profile
+
+    def signature(self, header: str) -> tuple:
+        """Cheap key that columns with equal stripped values always share."""
+        profile = self.profile(header)
+        stripped = None if profile.stripped is None else frozenset(profile.stripped.items())
+        return profile.empty, stripped
+
+    def rewrite(self, header: str, mapping: dict[str, str]) -> None:
+        column = self.column(header)
+        column[:] = [mapping.get(value, value) for value in column]
+        self.profiles.pop(header, None)
+
+    def digest(self, header: str) -> bytes:
+        """128-bit blake2b of the stripped column values, fed in chunks.
+
+        Values are separated by NUL, which cannot occur in XML text, so two
+        columns hash alike only if their stripped values match or blake2b
+        collides; callers confirm with ``same_values``.
+        """
+        column = self.column(header)
+        digest = hashlib.blake2b(digest_size=16)
+        for start in range(0, len(column), DIGEST_CHUNK):
+            chunk = column[start:start + DIGEST_CHUNK]
+            digest.update(("\0".join(value.strip() for value in chunk) + "\0").encode("utf-8"))
+        return digest.digest()
+
+    def same_values(self, first: str, second: str) -> bool:
+        first, second = self.column(first), self.column(second)
+        return first == second or all(a.strip() == b.strip() for a, b in zip(first, second))
+
+    def write_csv(self, destination: Path, headers: list[str]) -> None:
+        write_columns(destination, headers, [self.column(header) for header in headers])
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import csv
+import os
+from contextlib import contextmanager
+from operator import itemgetter
+from pathlib import Path
+
+# Buffer di scrittura: Products.csv supera i 10 MB, meglio poche write grandi.
+BUFFER_SIZE = 1 << 20
+
+
+def projection(headers: list[str], restval: str = ""):
+    """Row dict -> tuple in ``headers`` order, with the header order compiled once.
+
+    The fast path is a single ``itemgetter`` call; rows missing some header
+    fall back to ``restval`` like ``csv.DictWriter``. Extra keys are ignored.
+    """
+    if not headers:
+        return lambda row: ()
+    getter = itemgetter(*headers)
+    if len(headers) == 1:
+        fast = lambda row: (getter(row),)
+    else:
+        fast = getter
+
+    def project(row):
+        try:
+            return fast(row)
+        except KeyError:
+            return tuple(row.get(header, restval) for header in headers)
+
+    return project
+
+
+@contextmanager
+def atomic_open(destination: Path, encoding: str = "utf-8-sig"):
+    """Open a sibling temp file and move it onto ``destination`` only on success.
+
+    Readers (the Dropbox upload, the build cache) never see a half-written
+    CSV; on error the temp file is removed and the old file is left alone.
+    """
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    partial = destination.with_name(f".{destination.name}.{os.getpid()}.partial")
+    try:
+        with partial.open("w", newline="", encoding=encoding, buffering=BUFFER_SIZE) as handle:
+            yield handle
+        os.replace(partial, destination)
+    finally:
+        partial.unlink(missing_ok=True)
+
+
+def write_rows(destination: Path, headers: list[str], rows, encoding: str = "utf-8-sig") -> int:
+    """Write dict ``rows`` (any iterable) in ``headers`` order; returns the row count."""
+    project = projection(headers)
+    count = 0
+
+    def tuples():
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield project(row)
+
+    with atomic_open(destination, encoding) as handle:
+        writer = csv.writer(handle)
+        writer.writerow(headers)
+        writer.writerows(tuples())
+    return count
+
+
+def write_columns(destination: Path, headers: list[str], columns: list[list[str]], encoding: str = "utf-8-sig") -> None:
+    """Write column lists (same length, ``headers`` order) as CSV rows."""
+    with atomic_open(destination, encoding) as handle:
+        writer = csv.writer(handle)
+        writer.writerow(headers)
+        writer.writerows(zip(*columns))
@@ -4,15 +4,16 @@ import json
 import os
 import re
 import shutil
-from collections import Counter, defaultdict
 from datetime import datetime, timezone
 from pathlib import Path, PurePosixPath
-import xml.etree.ElementTree as ET
 
 import boto3
 from botocore.config import Config
 
-from build_exports import build_from_source_root
+from build_exports import schema_tasks
+from export_profiles import build_profiles, probe_schemas
+from feed_cache import FeedCache, SchemaFingerprints
+from xml_engine import schema_drift, schema_fingerprint
 
 S3_BUCKET = os.getenv("TOPPOINT_S3_BUCKET", "toppoint-xml")
 S3_PREFIX = os.getenv("TOPPOINT_S3_BASE_PREFIX", "EUR").strip("/")
@@ -22,6 +23,11 @@ OUT_DIR = Path(os.getenv("TOPPOINT_DIAGNOSTIC_DIR", "out/toppoint-diagnostic"))
 SOURCE_DIR = OUT_DIR / "source"
 SCHEMA_DIR = OUT_DIR / "schema"
 EXPORT_DIR = OUT_DIR / "exports"
+# Modalità sonda: schema campionato (primi N record / M MB di ogni XML), senza export.
+SCHEMA_SAMPLE_RECORDS = int(os.getenv("TOPPOINT_SCHEMA_SAMPLE_RECORDS", "0")) or None
+SCHEMA_SAMPLE_MB = float(os.getenv("TOPPOINT_SCHEMA_SAMPLE_MB", "0")) or None
+# Impronte degli schema per ETag: file invariati saltati, per quelli cambiati solo il diff strutturale.
+SCHEMA_FINGERPRINTS = os.getenv("TOPPOINT_SCHEMA_FINGERPRINTS", "1") != "0"
 
 SUPPORT_XML_NAMES = {
     "productimages",
@@ -31,10 +37,6 @@ SUPPORT_XML_NAMES = {
 }
 
 
-def local_name(tag: str) -> str:
-    return tag.rsplit("}", 1)[-1] if "}" in tag else tag
-
-
 def canonical_name(filename: str) -> str:
     stem = PurePosixPath(filename).stem.lower()
     return re.sub(r"[^a-z0-9]", "", stem)
@@ -86,6 +88,8 @@ def classify_key(key: str) -> set[str]:
 
     if path.endswith(".xml") and ("/feed-v4/" in path or canonical.endswith("v4")):
         classes.add("v4_xml")
+    if path.endswith(".xml") and "/feed-v3/" in path:
+        classes.add("v3_xml")
     if path.endswith(".xml") and re.fullmatch(r"stock(?:v\d+)?", canonical):
         classes.add("stock")
     if path.endswith(".xml") and "print" in canonical and "price" in canonical:
@@ -107,15 +111,21 @@ def unique_destination(key: str) -> Path:
 
 def download_selected(client, manifest: list[dict]) -> list[dict]:
     selected: list[dict] = []
-    wanted = {"v4_xml", "stock", "printprices", "support_xml"}
+    # V3 serve al profilo clean, lo stesso degli export di produzione.
+    wanted = {"v4_xml", "v3_xml", "stock", "printprices", "support_xml"}
+    cache = FeedCache()
     for item in manifest:
         classes = classify_key(item["key"])
         if not classes.intersection(wanted):
             continue
         destination = unique_destination(item["key"])
-        destination.parent.mkdir(parents=True, exist_ok=True)
-        print(f"Download s3://{S3_BUCKET}/{item['key']} -> {destination}")
-        client.download_file(S3_BUCKET, item["key"], str(destination))
+
+        def fetch(target: Path, key=item["key"]) -> None:
+            print(f"Download s3://{S3_BUCKET}/{key} -> {target}")
+            client.download_file(S3_BUCKET, key, str(target))
+
+        # ETag e dimensione arrivano già da list_objects: nessuna HEAD aggiuntiva.
+        cache.fetch(S3_BUCKET, item["key"], item["etag"], item["size"], fetch, destination)
         selected.append(
             {
                 **item,
@@ -128,53 +138,49 @@ def download_selected(client, manifest: list[dict]) -> list[dict]:
     return selected
 
 
-def schema_summary(path: Path) -> dict:
-    path_counts: Counter[str] = Counter()
-    attribute_counts: Counter[str] = Counter()
-    samples: dict[str, list[str]] = defaultdict(list)
-    stack: list[str] = []
-    root_tag = None
-    element_count = 0
-
-    for event, elem in ET.iterparse(path, events=("start", "end")):
-        tag = local_name(elem.tag)
-        if event == "start":
-            if root_tag is None:
-                root_tag = tag
-            stack.append(tag)
-            continue
+def record_schemas(xmls: list[dict], summaries: dict, fingerprints: SchemaFingerprints | None) -> tuple[list[dict], list[dict]]:
+    """Write the schema outputs of the analysed XMLs and classify every XML.
 
-        element_count += 1
-        current_path = "/".join(stack)
-        path_counts[current_path] += 1
-        for attr_name in elem.attrib:
-            attribute_counts[f"{current_path}/@{local_name(attr_name)}"] += 1
-
-        value = (elem.text or "").strip()
-        if value and len(samples[current_path]) < 5:
-            compact = re.sub(r"\s+", " ", value)
-            samples[current_path].append(compact[:500])
-
-        stack.pop()
-        elem.clear()
-
-    return {
-        "file": path.name,
-        "size": path.stat().st_size,
-        "root_tag": root_tag,
-        "element_count": element_count,
-        "paths": [
-            {"path": key, "count": count, "samples": samples.get(key, [])}
-            for key, count in path_counts.most_common()
-        ],
-        "attributes": [
-            {"path": key, "count": count}
-            for key, count in attribute_counts.most_common()
-        ],
-    }
-
-
-def write_text_report(manifest: list[dict], selected: list[dict], schemas: list[dict], exports: dict) -> None:
+    A file seen for the first time in this mode (full or sampled) gets its
+    full ``.schema.json``; a changed file only gets ``.drift.json`` with the
+    structural differences from its previous fingerprint; a file with the
+    same ETag was not analysed at all.
+    """
+    schemas: list[dict] = []
+    statuses: list[dict] = []
+    for item in xmls:
+        path = Path(item["local_path"])
+        schema = summaries.get(path.relative_to(SOURCE_DIR / "EUR").as_posix())
+        if schema is None:
+            statuses.append({"key": item["key"], "status": "unchanged"})
+            continue
+        schemas.append(schema)
+        fingerprint = schema_fingerprint(schema)
+        previous = fingerprints.previous(item["key"]) if fingerprints is not None else None
+        if previous is None:
+            (SCHEMA_DIR / f"{path.name}.schema.json").write_text(
+                json.dumps(schema, ensure_ascii=False, indent=2), encoding="utf-8"
+            )
+            status = {"key": item["key"], "status": "new"}
+        else:
+            drift = schema_drift(previous, fingerprint)
+            status = {"key": item["key"], "status": "drift" if drift else "same structure", **drift}
+            if drift:
+                (SCHEMA_DIR / f"{path.name}.drift.json").write_text(
+                    json.dumps({"file": path.name, "etag": [previous["etag"], item["etag"]], **drift}, ensure_ascii=False, indent=2),
+                    encoding="utf-8",
+                )
+        statuses.append(status)
+        if fingerprints is not None:
+            fingerprints.store(item["key"], item["etag"], fingerprint)
+    if fingerprints is not None:
+        fingerprints.save()
+    return schemas, statuses
+
+
+def write_text_report(
+    manifest: list[dict], selected: list[dict], schemas: list[dict], statuses: list[dict], exports: dict
+) -> None:
     lines = [
         "TOPPOINT S3 DIAGNOSTIC",
         f"Generated: {datetime.now(timezone.utc).isoformat()}",
@@ -193,17 +199,29 @@ def write_text_report(manifest: list[dict], selected: list[dict], schemas: list[
 
     lines.extend(["", "XML ROOTS"])
     for schema in schemas:
-        lines.append(
-            f"{schema['file']}: root={schema['root_tag']} "
-            f"elements={schema['element_count']} size={schema['size']}"
-        )
-
-    lines.extend([
-        "",
-        "GENERATED EXPORTS",
-        f"Products.csv: {exports['products']['rows']} rows, {exports['products']['columns']} columns",
-        f"DPO PRINT.csv: {exports['dpo_print']['rows']} rows",
-    ])
+        line = f"{schema['file']}: root={schema['root_tag']} elements={schema['element_count']} size={schema['size']}"
+        if "sampled" in schema:
+            sampled = schema["sampled"]
+            line += f" (sample: {sampled['records']} records, {sampled['bytes_read']} bytes)"
+        lines.append(line)
+
+    lines.extend(["", "SCHEMA DRIFT"])
+    for status in statuses:
+        changes = [
+            f"{len(value)} {name.replace('_', ' ')}"
+            for name, value in status.items()
+            if name not in ("key", "status")
+        ]
+        detail = f" ({', '.join(changes)})" if changes else ""
+        lines.append(f"{status['status']:>14}  {status['key']}{detail}")
+
+    lines.extend(["", "GENERATED EXPORTS"])
+    if not exports:
+        lines.append("skipped (schema sample mode)")
+    for profile, results in exports.items():
+        products, dpo = results["products"], results["dpo_print"]
+        lines.append(f"{profile}/Products.csv: {products['rows']} rows, {products['columns']} columns ({products['seconds']}s)")
+        lines.append(f"{profile}/DPO PRINT.csv: {dpo['rows']} rows ({dpo['seconds']}s)")
     (OUT_DIR / "diagnostic.txt").write_text("\n".join(lines), encoding="utf-8")
 
 
@@ -221,20 +239,24 @@ def main() -> int:
     )
 
     selected = download_selected(client, manifest)
-    schemas: list[dict] = []
-    for item in selected:
-        path = Path(item["local_path"])
-        if path.suffix.lower() != ".xml":
-            continue
-        print(f"Analisi schema XML: {path}")
-        schema = schema_summary(path)
-        schemas.append(schema)
-        (SCHEMA_DIR / f"{path.name}.schema.json").write_text(
-            json.dumps(schema, ensure_ascii=False, indent=2), encoding="utf-8"
-        )
-
-    exports = build_from_source_root(SOURCE_DIR / "EUR", EXPORT_DIR)
-    write_text_report(manifest, selected, schemas, exports)
+    xmls = [item for item in selected if Path(item["local_path"]).suffix.lower() == ".xml"]
+    sampled = bool(SCHEMA_SAMPLE_RECORDS or SCHEMA_SAMPLE_MB)
+    fingerprints = SchemaFingerprints(sampled=sampled) if SCHEMA_FINGERPRINTS else None
+    changed = [
+        Path(item["local_path"])
+        for item in xmls
+        if fingerprints is None or fingerprints.lookup(item["key"], item["etag"]) is None
+    ]
+    print(f"Schema da analizzare: {len(changed)} di {len(xmls)} XML (gli altri hanno lo stesso ETag)")
+    if sampled:
+        max_bytes = int(SCHEMA_SAMPLE_MB * 1024 * 1024) if SCHEMA_SAMPLE_MB else None
+        built = {"exports": {}, "schemas": probe_schemas(SOURCE_DIR / "EUR", SCHEMA_SAMPLE_RECORDS, max_bytes, changed)}
+    else:
+        # Un solo parse per XML: schema dei file cambiati, export legacy ed export clean (come in produzione).
+        built = build_profiles(SOURCE_DIR / "EUR", EXPORT_DIR, ["legacy", "clean"], schema_tasks(changed, SOURCE_DIR / "EUR"))
+    schemas, statuses = record_schemas(xmls, built["schemas"], fingerprints)
+
+    write_text_report(manifest, selected, schemas, statuses, built["exports"])
 
     # Non includere i feed XML completi nell'artifact di un repository pubblico.
     shutil.rmtree(SOURCE_DIR, ignore_errors=True)
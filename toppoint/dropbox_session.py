@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import json
+import queue
+import threading
+from pathlib import Path
+
+import requests
+
+TOKEN_URL = "https://api.dropboxapi.com/oauth2/token"
+UPLOAD_URL = "https://content.dropboxapi.com/2/files/upload"
+SESSION_START_URL = "https://content.dropboxapi.com/2/files/upload_session/start"
+SESSION_APPEND_URL = "https://content.dropboxapi.com/2/files/upload_session/append_v2"
+SESSION_FINISH_URL = "https://content.dropboxapi.com/2/files/upload_session/finish"
+CHUNK_SIZE = 8 * 1024 * 1024
+BUFFERED_CHUNKS = 2
+
+
+class DropboxSession:
+    """Upload session alimentata da un buffer limitato a BUFFERED_CHUNKS blocchi.
+
+    Un thread invia i blocchi mentre il chiamante continua a produrre i dati.
+    L'ultimo blocco resta in attesa finché non si sa che è l'ultimo, così il
+    commit (/finish) avviene solo a flusso completo; un flusso che resta sotto
+    un blocco, anche vuoto, va con il semplice /upload. Con ``abort()`` la
+    sessione viene abbandonata e il file su Dropbox non cambia.
+    """
+
+    def __init__(self, destination: str, token: str, mute: bool = True):
+        self.destination = destination
+        self.commit = {"path": destination, "mode": "overwrite", "autorename": False, "mute": mute}
+        self.headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/octet-stream",
+        }
+        self.buffer = bytearray()
+        self.chunks: queue.Queue = queue.Queue(maxsize=BUFFERED_CHUNKS)
+        self.error: Exception | None = None
+        self.aborted = False
+        self.worker = threading.Thread(target=self._run, name="dropbox-session", daemon=True)
+        self.worker.start()
+
+    def write(self, data: bytes) -> None:
+        if self.error is not None:
+            raise self.error
+        self.buffer += data
+        while len(self.buffer) >= CHUNK_SIZE:
+            self.chunks.put(bytes(self.buffer[:CHUNK_SIZE]))
+            del self.buffer[:CHUNK_SIZE]
+
+    def close(self) -> None:
+        if self.buffer:
+            self.chunks.put(bytes(self.buffer))
+            self.buffer.clear()
+        self.chunks.put(None)
+        self.worker.join()
+        if self.error is not None:
+            raise self.error
+
+    def abort(self) -> None:
+        self.aborted = True
+        self.chunks.put(None)
+        self.worker.join()
+
+    def _post(self, url: str, arg: dict, data: bytes) -> requests.Response:
+        response = requests.post(
+            url,
+            headers={**self.headers, "Dropbox-API-Arg": json.dumps(arg)},
+            data=data,
+            timeout=600,
+        )
+        response.raise_for_status()
+        return response
+
+    def _run(self) -> None:
+        session_id, offset, pending = None, 0, None
+        while True:
+            chunk = self.chunks.get()
+            if self.error is not None or self.aborted:
+                if chunk is None:
+                    return
+                continue
+            try:
+                if chunk is None:
+                    if session_id is None:
+                        # Nessuna sessione aperta: il file (anche a zero byte) va
+                        # comunque scritto, altrimenti resterebbe quello vecchio.
+                        self._post(UPLOAD_URL, self.commit, pending or b"")
+                    else:
+                        cursor = {"session_id": session_id, "offset": offset}
+                        self._post(SESSION_FINISH_URL, {"cursor": cursor, "commit": self.commit}, pending)
+                    return
+                if pending is not None:
+                    if session_id is None:
+                        session_id = self._post(SESSION_START_URL, {"close": False}, pending).json()["session_id"]
+                    else:
+                        cursor = {"session_id": session_id, "offset": offset}
+                        self._post(SESSION_APPEND_URL, {"cursor": cursor, "close": False}, pending)
+                    offset += len(pending)
+                pending = chunk
+            except Exception as exc:
+                self.error = exc
+
+
+def upload_chunked(path: Path, destination: str, token: str) -> None:
+    """Upload session per un file locale grande, con la stessa DropboxSession del relay."""
+    session = DropboxSession(destination, token)
+    try:
+        with path.open("rb") as handle:
+            while data := handle.read(CHUNK_SIZE):
+                session.write(data)
+    except BaseException:
+        session.abort()
+        raise
+    session.close()
@@ -0,0 +1,78 @@
+"""Profili di export Toppoint costruiti da un unico caricamento degli indici.
+
+Ogni profilo dichiara i loader che gli servono e il proprio registro di export.
+``build_profiles`` unisce i loader dei profili richiesti, legge ogni XML una
+volta sola (il riepilogo dello schema della diagnostica viaggia sullo stesso
+parse del loader del file) e genera gli export di tutti i profili in un unico
+pool, ciascuno in ``<output_dir>/<profilo>``.
+
+``probe_schemas`` è la variante rapida della sola diagnostica: schema
+campionato di ogni XML, un file per processo, senza export.
+"""
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
+import build_exports as base
+import build_exports_clean as clean
+from xml_engine import schema_summary
+
+
+def diagnostic_tasks(source_root: Path) -> list:
+    return base.schema_tasks(sorted(source_root.rglob("*.xml")), source_root)
+
+
+# nome -> (loader necessari, registro degli export)
+PROFILES = {
+    "legacy": (base.loader_tasks, base.EXPORTS),
+    "clean": (clean.loader_tasks, clean.EXPORTS),
+    "diagnostic": (diagnostic_tasks, {}),
+}
+
+
+def build_profiles(source_root: Path, output_dir: Path, names: list[str], extra_tasks=()) -> dict:
+    """Exports of every profile in ``names`` plus the schema summaries, from one parse per XML.
+
+    ``extra_tasks`` (e.g. ``base.schema_tasks`` for a subset of files) join the
+    same load. Returns ``{"exports": {profile: {export: result}}, "schemas":
+    {relative path: summary}}``.
+    """
+    tasks = [task for name in names for task in PROFILES[name][0](source_root)] + list(extra_tasks)
+    data = base.load_tasks(tasks)
+    base.report_peak_memory("dopo il caricamento degli indici")
+
+    registry = {
+        (name, export): (f"{name}/{filename}", builder)
+        for name in names
+        for export, (filename, builder) in PROFILES[name][1].items()
+    }
+    results = base.run_exports(data, output_dir, registry)
+    exports = {name: {} for name in names if PROFILES[name][1]}
+    for (name, export), result in results.items():
+        exports[name][export] = result
+        print(f"{name}/{Path(result['path']).name}: {result['rows']} righe ({result['seconds']}s)")
+    base.report_peak_memory("a fine build")
+
+    schemas = {key.split(":", 1)[1]: value for key, value in data.items() if key.startswith("schema:")}
+    return {"exports": exports, "schemas": schemas}
+
+
+def probe_schemas(source_root: Path, max_records: int | None = None, max_bytes: int | None = None, paths=None) -> dict:
+    """Sampled schema summaries of ``paths`` (default: every XML under ``source_root``), one file per worker.
+
+    Returns ``{relative path: summary}`` like ``build_profiles(...)["schemas"]``.
+    """
+    paths = sorted(source_root.rglob("*.xml") if paths is None else paths)
+    if not paths:
+        return {}
+    probe = partial(schema_summary, max_records=max_records, max_bytes=max_bytes)
+    workers = min(base.LOAD_WORKERS, len(paths))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            summaries = list(pool.map(probe, paths))
+    else:
+        summaries = [probe(path) for path in paths]
+    print(f"Schema campionato di {len(paths)} file ({workers} processi)")
+    return {path.relative_to(source_root).as_posix(): summary for path, summary in zip(paths, summaries)}
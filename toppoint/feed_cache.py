@@ -0,0 +1,283 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+CACHE_DIR = Path(os.getenv("TOPPOINT_CACHE_DIR", Path.home() / ".cache" / "toppoint"))
+FEED_CACHE_MAX_MB = int(os.getenv("TOPPOINT_FEED_CACHE_MAX_MB", "4096"))
+
+
+def head(client, bucket: str, key: str) -> tuple[str, int]:
+    meta = client.head_object(Bucket=bucket, Key=key)
+    return str(meta.get("ETag", "")).strip('"'), int(meta.get("ContentLength", 0))
+
+
+def materialize(source: Path, destination: Path) -> Path:
+    """Hardlink dalla cache (stesso filesystem), altrimenti copia."""
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    if destination.exists():
+        destination.unlink()
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+    return destination
+
+
+class FeedCache:
+    """Copia locale persistente dei feed S3, valida finché l'ETag non cambia.
+
+    Ogni oggetto è salvato in ``<root>/<bucket>/<key>`` con la stessa struttura
+    di cartelle del bucket, quindi i builder possono leggere direttamente dalla
+    cache. ``index.json`` registra ETag, dimensione e ultimo utilizzo; oltre
+    ``max_bytes`` si eliminano gli oggetti usati meno di recente, mai quelli
+    letti dal processo corrente.
+    """
+
+    def __init__(self, root: Path | None = None, max_bytes: int | None = None):
+        self.root = root or CACHE_DIR / "feeds"
+        self.max_bytes = FEED_CACHE_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+        self.index_path = self.root / "index.json"
+        self.lock = threading.Lock()
+        self.session_start = time.time()
+        try:
+            self.entries: dict[str, dict] = json.loads(self.index_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def path_for(self, bucket: str, key: str) -> Path:
+        return self.root / bucket / key
+
+    def lookup(self, bucket: str, key: str, etag: str, size: int | None = None) -> Path | None:
+        entry = self.entries.get(f"{bucket}/{key}")
+        path = self.path_for(bucket, key)
+        if not entry or not etag or entry["etag"] != etag or not path.exists():
+            return None
+        if path.stat().st_size != entry["size"] or (size is not None and entry["size"] != size):
+            return None
+        with self.lock:
+            entry["used"] = time.time()
+            self._save()
+        return path
+
+    def fetch(
+        self,
+        bucket: str,
+        key: str,
+        etag: str,
+        size: int,
+        download: Callable[[Path], None],
+        destination: Path | None = None,
+    ) -> Path:
+        path = self.lookup(bucket, key, etag, size)
+        if path is not None:
+            print(f"Cache: s3://{bucket}/{key} invariato (ETag {etag})")
+        else:
+            path = self.path_for(bucket, key)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            partial = path.with_name(path.name + ".part")
+            download(partial)
+            os.replace(partial, path)
+            with self.lock:
+                self.entries[f"{bucket}/{key}"] = {
+                    "etag": etag,
+                    "size": path.stat().st_size,
+                    "used": time.time(),
+                }
+                self._evict()
+                self._save()
+        return materialize(path, destination) if destination is not None else path
+
+    def _evict(self) -> None:
+        total = sum(entry["size"] for entry in self.entries.values())
+        for name, entry in sorted(self.entries.items(), key=lambda item: item[1]["used"]):
+            if total <= self.max_bytes:
+                break
+            if entry["used"] >= self.session_start:
+                continue
+            (self.root / name).unlink(missing_ok=True)
+            del self.entries[name]
+            total -= entry["size"]
+            print(f"Cache: rimosso {name} ({entry['size']} byte)")
+
+    def _save(self) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.entries, indent=1), encoding="utf-8")
+        os.replace(tmp, self.index_path)
+
+
+def manifest_fingerprint(manifest: dict[str, tuple[str, int]], code_version: str) -> str:
+    """Impronta dei sorgenti (chiave, ETag, dimensione) più la versione del codice di build."""
+    digest = hashlib.sha256(code_version.encode())
+    for key in sorted(manifest):
+        etag, size = manifest[key]
+        digest.update(f"\n{key}\t{etag}\t{size}".encode())
+    return digest.hexdigest()
+
+
+def code_version(directory: Path | None = None) -> str:
+    """Hash di tutti i moduli Python Toppoint: qualunque modifica al codice invalida le build."""
+    digest = hashlib.sha256()
+    for path in sorted((directory or Path(__file__).resolve().parent).glob("*.py")):
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+class BuildCache:
+    """Export già generati, indicizzati per impronta del manifest dei sorgenti."""
+
+    def __init__(self, root: Path | None = None, keep: int = 2):
+        self.root = root or CACHE_DIR / "builds"
+        self.keep = keep
+
+    def lookup(self, fingerprint: str) -> tuple[Path, dict] | None:
+        directory = self.root / fingerprint
+        try:
+            result = json.loads((directory / "result.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if not all(Path(item["path"]).exists() for item in result.values()):
+            return None
+        os.utime(directory)
+        return directory, result
+
+    def store(self, fingerprint: str, result: dict) -> tuple[Path, dict]:
+        directory = self.root / fingerprint
+        partial = self.root / f"{fingerprint}.part"
+        shutil.rmtree(partial, ignore_errors=True)
+        partial.mkdir(parents=True)
+        stored = {}
+        for name, item in result.items():
+            filename = Path(item["path"]).name
+            shutil.copyfile(item["path"], partial / filename)
+            stored[name] = {**item, "path": str(directory / filename)}
+        (partial / "result.json").write_text(json.dumps(stored, ensure_ascii=False, indent=1), encoding="utf-8")
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(partial, directory)
+        builds = sorted((d for d in self.root.iterdir() if d.is_dir()), key=lambda d: d.stat().st_mtime, reverse=True)
+        for old in builds[self.keep:]:
+            shutil.rmtree(old, ignore_errors=True)
+        return directory, stored
+
+
+def file_digest(path: Path) -> str:
+    with open(path, "rb") as handle:
+        return hashlib.file_digest(handle, "blake2b").hexdigest()[:32]
+
+
+class IndexSnapshots:
+    """Indici già calcolati dai loader di load_indexes, in pickle versionati.
+
+    Uno snapshot per coppia (loader, file): la chiave è l'hash del contenuto
+    del file sorgente più la versione del codice, quindi un feed identico
+    (anche scaricato in un'altra cartella) non viene riletto, mentre un feed
+    cambiato o un builder modificato ricostruiscono solo quell'indice.
+    """
+
+    FORMAT = 1
+
+    def __init__(self, root: Path | None = None, version: str | None = None):
+        self.root = root or CACHE_DIR / "indexes"
+        self.version = version or code_version()
+
+    def key(self, loader: Callable, source: Path) -> tuple:
+        return (self.FORMAT, self.version, f"{loader.__module__}.{loader.__qualname__}", file_digest(source))
+
+    def path_for(self, loader: Callable, source: Path) -> Path:
+        return self.root / f"{loader.__module__}.{loader.__qualname__}-{source.name}.pickle"
+
+    def load(self, loader: Callable, source: Path, key: tuple):
+        try:
+            with open(self.path_for(loader, source), "rb") as handle:
+                if pickle.load(handle) != key:
+                    return None
+                return pickle.load(handle)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return None
+
+    def store(self, loader: Callable, source: Path, key: tuple, value) -> None:
+        path = self.path_for(loader, source)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_name(f"{path.name}.{os.getpid()}.part")
+        with open(partial, "wb") as handle:
+            pickle.dump(key, handle, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(value, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(partial, path)
+
+
+class RowCache:
+    """Righe di Products.csv già costruite, indicizzate per hash dei frammenti sorgente del prodotto.
+
+    Un unico pickle ``{hash: (intestazioni, tuple di valori, colonne candidate)}``,
+    versionato con il codice: un builder modificato scarta tutte le voci. A
+    ogni salvataggio restano solo i prodotti dell'ultima build.
+    """
+
+    FORMAT = 1
+
+    def __init__(self, path: Path | None = None, version: str | None = None):
+        self.path = path or CACHE_DIR / "rows" / "products.pickle"
+        self.version = version or code_version()
+
+    def load(self) -> dict:
+        try:
+            with open(self.path, "rb") as handle:
+                if pickle.load(handle) != (self.FORMAT, self.version):
+                    return {}
+                return pickle.load(handle)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return {}
+
+    def store(self, entries: dict) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        partial = self.path.with_name(f"{self.path.name}.{os.getpid()}.part")
+        with open(partial, "wb") as handle:
+            pickle.dump((self.FORMAT, self.version), handle, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(entries, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(partial, self.path)
+
+
+class SchemaFingerprints:
+    """Impronte degli schema degli XML (``xml_engine.schema_fingerprint``), per chiave S3.
+
+    Un unico ``fingerprints.json`` con una sezione per modalità (schema
+    completo o campionato, ``{chiave: {"etag": ..., **impronta}}``): ogni
+    modalità salta gli oggetti con lo stesso ETag e confronta quelli cambiati
+    solo con un'impronta presa allo stesso modo.
+    """
+
+    FORMAT = 2
+
+    def __init__(self, path: Path | None = None, sampled: bool = False):
+        self.path = path or CACHE_DIR / "schemas" / "fingerprints.json"
+        try:
+            stored = json.loads(self.path.read_text(encoding="utf-8"))
+            self.modes: dict[str, dict] = stored["modes"] if stored.get("format") == self.FORMAT else {}
+        except (OSError, ValueError, KeyError, AttributeError):
+            self.modes = {}
+        self.entries: dict[str, dict] = self.modes.setdefault("sampled" if sampled else "full", {})
+
+    def lookup(self, key: str, etag: str) -> dict | None:
+        entry = self.entries.get(key)
+        return entry if entry is not None and entry["etag"] == etag else None
+
+    def previous(self, key: str) -> dict | None:
+        return self.entries.get(key)
+
+    def store(self, key: str, etag: str, fingerprint: dict) -> None:
+        self.entries[key] = {"etag": etag, **fingerprint}
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"format": self.FORMAT, "modes": self.modes}, indent=1), encoding="utf-8")
+        os.replace(tmp, self.path)
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import time
+
+from dropbox_session import DropboxSession
+
+READ_SIZE = 1024 * 1024
+
+
+class XmlSniffer:
+    """Stessi controlli di validate_download, ma sui primi byte del flusso."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.head = b""
+        self.checked = False
+        self.size = 0
+
+    def feed(self, data: bytes) -> None:
+        self.size += len(data)
+        if self.checked:
+            return
+        self.head += data
+        if len(self.head) >= 256:
+            self._check()
+
+    def close(self) -> None:
+        if self.size == 0:
+            raise RuntimeError(f"Download vuoto o mancante: {self.name}")
+        if not self.checked:
+            self._check()
+
+    def _check(self) -> None:
+        self.checked = True
+        if not self.head[:256].lstrip().startswith((b"<?xml", b"<")):
+            raise RuntimeError(f"Il file non sembra XML: {self.name}")
+
+
+def relay_s3_to_dropbox(client, bucket: str, key: str, destination: str, token: str) -> int:
+    """GetObject in streaming direttamente verso Dropbox, senza passare dal disco."""
+    started = time.monotonic()
+    body = client.get_object(Bucket=bucket, Key=key)["Body"]
+    sniffer = XmlSniffer(key)
+    session = DropboxSession(destination, token)
+    try:
+        for data in body.iter_chunks(chunk_size=READ_SIZE):
+            sniffer.feed(data)
+            session.write(data)
+        sniffer.close()
+    except BaseException:
+        session.abort()
+        raise
+    finally:
+        body.close()
+    session.close()
+    elapsed = time.monotonic() - started
+    print(
+        f"Relay s3://{bucket}/{key} -> Dropbox {destination} "
+        f"({sniffer.size} byte in {elapsed:.1f}s)"
+    )
+    return sniffer.size
+
@@ -4,25 +4,36 @@ import argparse
 import json
 import os
 import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import boto3
 import requests
+from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
 
 from build_exports_clean import build_from_source_root
+from dropbox_session import TOKEN_URL, UPLOAD_URL, upload_chunked
+from feed_cache import BuildCache, FeedCache, code_version, head, manifest_fingerprint
+from relay import relay_s3_to_dropbox
 
 S3_BUCKET = os.getenv("TOPPOINT_S3_BUCKET", "toppoint-xml")
 S3_REGION = os.getenv("TOPPOINT_S3_REGION", "eu-north-1")
 S3_ENDPOINT = os.getenv("TOPPOINT_S3_ENDPOINT", "https://s3-eu-north-1.amazonaws.com")
 DROPBOX_BASE_PATH = os.getenv("DROPBOX_BASE_PATH_TOPPOINT", "/Toppoint").rstrip("/")
 
-TOKEN_URL = "https://api.dropboxapi.com/oauth2/token"
-UPLOAD_URL = "https://content.dropboxapi.com/2/files/upload"
-SESSION_START_URL = "https://content.dropboxapi.com/2/files/upload_session/start"
-SESSION_APPEND_URL = "https://content.dropboxapi.com/2/files/upload_session/append_v2"
-SESSION_FINISH_URL = "https://content.dropboxapi.com/2/files/upload_session/finish"
-CHUNK_SIZE = 8 * 1024 * 1024
+# Download paralleli: un thread per file, e GET a range multipart sui grandi XML V3/V4.
+DOWNLOAD_WORKERS = int(os.getenv("TOPPOINT_DOWNLOAD_WORKERS", "6"))
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=16 * 1024 * 1024,
+    multipart_chunksize=16 * 1024 * 1024,
+    max_concurrency=8,
+    use_threads=True,
+)
+# stock.xml passa da S3 a Dropbox in streaming, senza file locale.
+STOCK_RELAY = os.getenv("TOPPOINT_STOCK_RELAY", "1") == "1"
 
 WEEKLY_SOURCES = [
     # V4: primary source and all new attributes.
@@ -46,6 +57,13 @@ WEEKLY_SOURCES = [
     "EUR/printprices.xml",
 ]
 
+# Sorgenti caricati così come sono su Dropbox: servono anche quando la build è in cache.
+UPLOADED_SOURCES = {
+    "EUR/feed-v4/Products_v4.xml": "Products_v4.xml",
+    "EUR/feed-v4/Print_v4.xml": "Print.xml",
+    "EUR/printprices.xml": "printprices.xml",
+}
+
 
 def s3_client():
     return boto3.client(
@@ -57,18 +75,70 @@ def s3_client():
         config=Config(
             retries={"max_attempts": 5, "mode": "standard"},
             s3={"addressing_style": "path"},
+            max_pool_connections=DOWNLOAD_WORKERS * TRANSFER_CONFIG.max_concurrency,
         ),
     )
 
 
-def download_key(client, key: str, root: Path) -> Path:
-    destination = root / key
-    destination.parent.mkdir(parents=True, exist_ok=True)
-    print(f"Download s3://{S3_BUCKET}/{key} -> {destination}")
-    client.download_file(S3_BUCKET, key, str(destination))
-    if not destination.exists() or destination.stat().st_size == 0:
-        raise RuntimeError(f"Download vuoto: {key}")
-    return destination
+def mb_per_s(size: int, elapsed: float) -> str:
+    return f"{size / 1024 / 1024 / max(elapsed, 1e-6):.1f} MB/s"
+
+
+class DownloadProgress:
+    """Callback boto3: avanzamento a scatti del 25% e throughput a fine file."""
+
+    def __init__(self, key: str, size: int):
+        self.key = key
+        self.size = size
+        self.seen = 0
+        self.next_step = 25
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+
+    def __call__(self, amount: int) -> None:
+        with self.lock:
+            self.seen += amount
+            if not self.size:
+                return
+            percent = self.seen * 100 // self.size
+            if percent >= self.next_step and percent < 100:
+                print(f"  {self.key}: {percent}% di {self.size} byte")
+                self.next_step = (percent // 25 + 1) * 25
+
+    def done(self) -> None:
+        elapsed = time.monotonic() - self.started
+        print(f"  {self.key}: {self.seen} byte in {elapsed:.1f}s ({mb_per_s(self.seen, elapsed)})")
+
+
+def download_key(client, cache: FeedCache, key: str, meta: tuple[str, int] | None = None) -> Path:
+    """Scarica solo se l'ETag differisce dalla copia in cache; restituisce il file in cache."""
+    etag, size = meta or head(client, S3_BUCKET, key)
+
+    def fetch(target: Path) -> None:
+        print(f"Download s3://{S3_BUCKET}/{key} -> {target} ({size} byte)")
+        progress = DownloadProgress(key, size)
+        client.download_file(S3_BUCKET, key, str(target), Config=TRANSFER_CONFIG, Callback=progress)
+        progress.done()
+        if not target.exists() or target.stat().st_size == 0:
+            raise RuntimeError(f"Download vuoto: {key}")
+
+    return cache.fetch(S3_BUCKET, key, etag, size, fetch)
+
+
+def source_manifest(client, keys: list[str]) -> dict[str, tuple[str, int]]:
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as pool:
+        return dict(zip(keys, pool.map(lambda key: head(client, S3_BUCKET, key), keys)))
+
+
+def download_keys(client, cache: FeedCache, keys, manifest: dict[str, tuple[str, int]]) -> dict[str, Path]:
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as pool:
+        futures = {key: pool.submit(download_key, client, cache, key, manifest.get(key)) for key in keys}
+        paths = {key: future.result() for key, future in futures.items()}
+    elapsed = time.monotonic() - started
+    total = sum(path.stat().st_size for path in paths.values())
+    print(f"Sorgenti pronti: {len(paths)} file, {total} byte in {elapsed:.1f}s ({mb_per_s(total, elapsed)})")
+    return paths
 
 
 def dropbox_access_token() -> str:
@@ -105,69 +175,6 @@ def upload_small(path: Path, destination: str, token: str) -> None:
     response.raise_for_status()
 
 
-def upload_chunked(path: Path, destination: str, token: str) -> None:
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/octet-stream",
-    }
-    with path.open("rb") as handle:
-        first = handle.read(CHUNK_SIZE)
-        response = requests.post(
-            SESSION_START_URL,
-            headers={**headers, "Dropbox-API-Arg": json.dumps({"close": False})},
-            data=first,
-            timeout=600,
-        )
-        response.raise_for_status()
-        session_id = response.json()["session_id"]
-        offset = len(first)
-
-        while True:
-            chunk = handle.read(CHUNK_SIZE)
-            if not chunk:
-                break
-            next_chunk = handle.read(CHUNK_SIZE)
-            is_last = not next_chunk
-            cursor = {"session_id": session_id, "offset": offset}
-            if is_last:
-                response = requests.post(
-                    SESSION_FINISH_URL,
-                    headers={
-                        **headers,
-                        "Dropbox-API-Arg": json.dumps(
-                            {
-                                "cursor": cursor,
-                                "commit": {
-                                    "path": destination,
-                                    "mode": "overwrite",
-                                    "autorename": False,
-                                    "mute": True,
-                                },
-                            }
-                        ),
-                    },
-                    data=chunk,
-                    timeout=600,
-                )
-                response.raise_for_status()
-                return
-
-            response = requests.post(
-                SESSION_APPEND_URL,
-                headers={
-                    **headers,
-                    "Dropbox-API-Arg": json.dumps({"cursor": cursor, "close": False}),
-                },
-                data=chunk,
-                timeout=600,
-            )
-            response.raise_for_status()
-            offset += len(chunk)
-            handle.seek(-len(next_chunk), 1)
-
-    raise RuntimeError(f"Upload chunked non completato: {path}")
-
-
 def upload(path: Path, filename: str, token: str) -> str:
     destination = f"{DROPBOX_BASE_PATH}/{filename}"
     if path.stat().st_size <= 140 * 1024 * 1024:
@@ -181,35 +188,45 @@ def upload(path: Path, filename: str, token: str) -> str:
 def sync_stock() -> None:
     client = s3_client()
     token = dropbox_access_token()
-    with tempfile.TemporaryDirectory(prefix="toppoint-stock-") as tmp:
-        root = Path(tmp)
-        stock = download_key(client, "EUR/stock.xml", root)
-        upload(stock, "stock.xml", token)
+    if STOCK_RELAY:
+        relay_s3_to_dropbox(client, S3_BUCKET, "EUR/stock.xml", f"{DROPBOX_BASE_PATH}/stock.xml", token)
+        return
+    stock = download_key(client, FeedCache(), "EUR/stock.xml")
+    upload(stock, "stock.xml", token)
 
 
 def sync_weekly() -> None:
     client = s3_client()
     token = dropbox_access_token()
-    with tempfile.TemporaryDirectory(prefix="toppoint-weekly-") as tmp:
-        root = Path(tmp)
-        for key in WEEKLY_SOURCES:
-            download_key(client, key, root)
-
-        source_root = root / "EUR"
-        export_dir = root / "exports"
-        result = build_from_source_root(source_root, export_dir)
-
-        upload(export_dir / "Products.csv", "Products.csv", token)
-        upload(source_root / "feed-v4" / "Products_v4.xml", "Products_v4.xml", token)
-        upload(source_root / "feed-v4" / "Print_v4.xml", "Print.xml", token)
-        upload(export_dir / "DPO PRINT.csv", "DPO PRINT.csv", token)
-        upload(source_root / "printprices.xml", "printprices.xml", token)
-
-        print(
-            "Weekly Toppoint completato: "
-            f"Products={result['products']['rows']} righe, "
-            f"DPO={result['dpo_print']['rows']} righe"
-        )
+    cache = FeedCache()
+    builds = BuildCache()
+    manifest = source_manifest(client, WEEKLY_SOURCES)
+    fingerprint = manifest_fingerprint(manifest, code_version())
+    cached = builds.lookup(fingerprint)
+
+    if cached is not None:
+        # Sorgenti e builder invariati: si riusano Products.csv e DPO PRINT.csv.
+        print(f"Build in cache ({fingerprint[:12]}): ricostruzione saltata")
+        export_dir, result = cached
+        download_keys(client, cache, UPLOADED_SOURCES, manifest)
+    else:
+        download_keys(client, cache, WEEKLY_SOURCES, manifest)
+        # I builder leggono i sorgenti direttamente dalla cache (stessa struttura del bucket).
+        source_root = cache.path_for(S3_BUCKET, "EUR")
+        with tempfile.TemporaryDirectory(prefix="toppoint-weekly-") as tmp:
+            result = build_from_source_root(source_root, Path(tmp) / "exports")
+            export_dir, result = builds.store(fingerprint, result)
+
+    upload(export_dir / "Products.csv", "Products.csv", token)
+    for key, filename in UPLOADED_SOURCES.items():
+        upload(cache.path_for(S3_BUCKET, key), filename, token)
+    upload(export_dir / "DPO PRINT.csv", "DPO PRINT.csv", token)
+
+    print(
+        "Weekly Toppoint completato: "
+        f"Products={result['products']['rows']} righe, "
+        f"DPO={result['dpo_print']['rows']} righe"
+    )
 
 
 def main() -> int:
@@ -5,12 +5,18 @@ import json
 import os
 import re
 import sys
+import time
 from pathlib import Path, PurePosixPath
 from typing import Iterable
 
 import boto3
 import requests
 from botocore.config import Config
+from botocore.exceptions import ClientError
+
+from dropbox_session import TOKEN_URL, UPLOAD_URL, upload_chunked
+from feed_cache import CACHE_DIR, FeedCache, head
+from relay import relay_s3_to_dropbox
 
 S3_BUCKET = os.getenv("TOPPOINT_S3_BUCKET", "toppoint-xml")
 S3_PREFIX = os.getenv("TOPPOINT_S3_PREFIX", "EUR/V4").strip("/")
@@ -26,12 +32,13 @@ EXPECTED_STEMS = {
     "printprices": {"printprice", "printprices", "print_price", "print_prices"},
 }
 
-TOKEN_URL = "https://api.dropboxapi.com/oauth2/token"
-UPLOAD_URL = "https://content.dropboxapi.com/2/files/upload"
-SESSION_START_URL = "https://content.dropboxapi.com/2/files/upload_session/start"
-SESSION_APPEND_URL = "https://content.dropboxapi.com/2/files/upload_session/append_v2"
-SESSION_FINISH_URL = "https://content.dropboxapi.com/2/files/upload_session/finish"
-CHUNK_SIZE = 8 * 1024 * 1024
+STOCK_RELAY = os.getenv("TOPPOINT_STOCK_RELAY", "1") == "1"
+
+# Le cartelle V4 trovate dalla ricerca per livelli restano valide per DISCOVERY_TTL secondi.
+DISCOVERY_CACHE = CACHE_DIR / "discovery.json"
+DISCOVERY_TTL = float(os.getenv("TOPPOINT_DISCOVERY_TTL_HOURS", "24")) * 3600
+DISCOVERY_MAX_DEPTH = 4
+V4_SEGMENTS = {"v4", "version4", "xmlv4", "feedv4"}
 
 
 def normalized_stem(key: str) -> str:
@@ -76,43 +83,86 @@ def list_keys_for_prefix(client, prefix: str) -> list[str]:
     return keys
 
 
-def is_v4_key(key: str) -> bool:
-    segments = [normalized_segment(part) for part in PurePosixPath(key).parts[:-1]]
-    return any(segment in {"v4", "version4", "xmlv4", "feedv4"} for segment in segments)
+def list_level(client, prefix: str) -> list[str]:
+    """Sottocartelle dirette di ``prefix`` (CommonPrefixes con Delimiter="/")."""
+    paginator = client.get_paginator("list_objects_v2")
+    folders: list[str] = []
+    for page in paginator.paginate(Bucket=S3_BUCKET, Prefix=prefix, Delimiter="/"):
+        folders.extend(item["Prefix"] for item in page.get("CommonPrefixes", []))
+    return folders
+
+
+def discover_v4_roots(client, start: str) -> list[str]:
+    """Visita il bucket livello per livello fino alle prime cartelle con nome V4."""
+    level = [f"{start.strip('/')}/" if start.strip("/") else ""]
+    for _ in range(DISCOVERY_MAX_DEPTH):
+        children = [folder for prefix in level for folder in list_level(client, prefix)]
+        roots = [f for f in children if normalized_segment(PurePosixPath(f).name) in V4_SEGMENTS]
+        if roots or not children:
+            return roots
+        level = children
+    return []
+
 
+def load_discovery() -> dict | None:
+    try:
+        cached = json.loads(DISCOVERY_CACHE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if cached.get("bucket") != S3_BUCKET or cached.get("prefix") != S3_PREFIX:
+        return None
+    if time.time() - cached.get("resolved_at", 0) > DISCOVERY_TTL:
+        return None
+    return cached
+
+
+def save_discovery(roots: list[str]) -> None:
+    DISCOVERY_CACHE.parent.mkdir(parents=True, exist_ok=True)
+    payload = {
+        "bucket": S3_BUCKET,
+        "prefix": S3_PREFIX,
+        "roots": roots,
+        "resolved_at": time.time(),
+    }
+    DISCOVERY_CACHE.write_text(json.dumps(payload, indent=1), encoding="utf-8")
 
-def list_keys(client) -> list[str]:
-    keys = list_keys_for_prefix(client, S3_PREFIX)
+
+def list_keys(client, use_cache: bool = True) -> list[str]:
+    # Senza prefisso configurato si passa subito alla ricerca per livelli,
+    # invece di elencare l'intero bucket.
+    keys = list_keys_for_prefix(client, S3_PREFIX) if S3_PREFIX else []
     if keys:
         print(f"Percorso S3 utilizzato: s3://{S3_BUCKET}/{S3_PREFIX}/")
         return keys
 
-    base_prefix = S3_PREFIX.split("/", 1)[0] if S3_PREFIX else "EUR"
-    broader_keys = list_keys_for_prefix(client, base_prefix)
-
-    if not broader_keys:
-        broader_keys = list_keys_for_prefix(client, "")
-
-    if not broader_keys:
-        raise RuntimeError(
-            f"Nessun file visibile nel bucket s3://{S3_BUCKET}/. "
-            "Le credenziali sono state accettate, ma non risultano oggetti accessibili."
-        )
+    # In cache solo le cartelle V4: le chiavi si rielencano a ogni run, così
+    # file nuovi o rinominati compaiono subito (una LIST paginata per cartella).
+    cached = load_discovery() if use_cache else None
+    if cached:
+        keys = [key for root in cached["roots"] for key in list_keys_for_prefix(client, root)]
+        if keys:
+            print(f"Percorso S3 dalla cache: {', '.join(cached['roots'])}")
+            return keys
 
-    v4_keys = [key for key in broader_keys if is_v4_key(key)]
+    base_prefix = S3_PREFIX.split("/", 1)[0] if S3_PREFIX else "EUR"
+    roots = discover_v4_roots(client, base_prefix) or discover_v4_roots(client, "")
+    v4_keys = [key for root in roots for key in list_keys_for_prefix(client, root)]
     if v4_keys:
-        detected_roots = sorted(
-            {"/".join(PurePosixPath(key).parts[:-1]) for key in v4_keys}
-        )
         print("Percorso V4 rilevato automaticamente:")
-        for root in detected_roots[:20]:
-            print(f"  - s3://{S3_BUCKET}/{root}/")
+        for root in roots[:20]:
+            print(f"  - s3://{S3_BUCKET}/{root}")
+        save_discovery(roots)
         return v4_keys
 
-    sample = ", ".join(sorted(broader_keys)[:80])
+    sample = ", ".join(sorted(list_keys_for_prefix(client, base_prefix))[:80])
+    if not sample:
+        raise RuntimeError(
+            f"Nessun file visibile in s3://{S3_BUCKET}/{base_prefix}/. "
+            "Le credenziali sono state accettate, ma non risultano oggetti accessibili."
+        )
     raise RuntimeError(
         "Nessuna cartella V4 riconosciuta. "
-        f"Primi file visibili nel bucket: {sample}"
+        f"Primi file visibili: {sample}"
     )
 
 
@@ -181,72 +231,6 @@ def upload_small(path: Path, destination: str, token: str) -> None:
     response.raise_for_status()
 
 
-def upload_chunked(path: Path, destination: str, token: str) -> None:
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/octet-stream",
-    }
-    with path.open("rb") as handle:
-        first = handle.read(CHUNK_SIZE)
-        response = requests.post(
-            SESSION_START_URL,
-            headers={**headers, "Dropbox-API-Arg": json.dumps({"close": False})},
-            data=first,
-            timeout=600,
-        )
-        response.raise_for_status()
-        session_id = response.json()["session_id"]
-        offset = len(first)
-
-        while True:
-            chunk = handle.read(CHUNK_SIZE)
-            if not chunk:
-                break
-            next_chunk = handle.read(CHUNK_SIZE)
-            is_last = not next_chunk
-            cursor = {"session_id": session_id, "offset": offset}
-
-            if is_last:
-                response = requests.post(
-                    SESSION_FINISH_URL,
-                    headers={
-                        **headers,
-                        "Dropbox-API-Arg": json.dumps(
-                            {
-                                "cursor": cursor,
-                                "commit": {
-                                    "path": destination,
-                                    "mode": "overwrite",
-                                    "autorename": False,
-                                    "mute": True,
-                                },
-                            }
-                        ),
-                    },
-                    data=chunk,
-                    timeout=600,
-                )
-                response.raise_for_status()
-                return
-
-            response = requests.post(
-                SESSION_APPEND_URL,
-                headers={
-                    **headers,
-                    "Dropbox-API-Arg": json.dumps(
-                        {"cursor": cursor, "close": False}
-                    ),
-                },
-                data=chunk,
-                timeout=600,
-            )
-            response.raise_for_status()
-            offset += len(chunk)
-            handle.seek(-len(next_chunk), 1)
-
-    raise RuntimeError(f"Upload chunked non completato: {path}")
-
-
 def upload_to_dropbox(path: Path) -> str:
     token = dropbox_access_token()
     destination = f"{DROPBOX_BASE_PATH}/{path.name}"
@@ -259,16 +243,36 @@ def upload_to_dropbox(path: Path) -> str:
 
 def sync(logical_names: list[str]) -> None:
     client = s3_client()
-    keys = list_keys(client)
+    try:
+        sync_keys(client, list_keys(client), logical_names)
+    except ClientError as exc:
+        # Una chiave sparita tra l'elenco e il download: si rifà la ricerca una volta, senza cache.
+        if exc.response.get("Error", {}).get("Code") not in {"404", "NoSuchKey"}:
+            raise
+        print("Chiave S3 non più disponibile: nuova ricerca del percorso V4")
+        sync_keys(client, list_keys(client, use_cache=False), logical_names)
+
+
+def sync_keys(client, keys: list[str], logical_names: list[str]) -> None:
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    cache = FeedCache()
 
     for logical_name in logical_names:
         key = select_key(keys, logical_name)
         suffixes = "".join(PurePosixPath(key).suffixes) or ".xml"
         local_path = OUTPUT_DIR / f"{logical_name}{suffixes}"
-        print(f"Download s3://{S3_BUCKET}/{key} -> {local_path}")
-        client.download_file(S3_BUCKET, key, str(local_path))
-        validate_download(local_path)
+        if logical_name == "stock" and STOCK_RELAY:
+            destination = f"{DROPBOX_BASE_PATH}/{local_path.name}"
+            relay_s3_to_dropbox(client, S3_BUCKET, key, destination, dropbox_access_token())
+            continue
+        etag, size = head(client, S3_BUCKET, key)
+
+        def fetch(target: Path, key=key) -> None:
+            print(f"Download s3://{S3_BUCKET}/{key} -> {target}")
+            client.download_file(S3_BUCKET, key, str(target))
+            validate_download(target)
+
+        cache.fetch(S3_BUCKET, key, etag, size, fetch, local_path)
         destination = upload_to_dropbox(local_path)
         print(
             f"Caricato su Dropbox: {destination} "
@@ -60,17 +60,22 @@ def main():
         assert metal<={'Sì','No'},metal
         audit='v4__Sustainability_Compliance__From_Social_Audited_Factory'; assert audit in headers
         audits={r[audit] for r in rows if r[audit]}; assert audits<={'Sì','No'},audits
-        sig={}; dup=[]
-        for h in headers:
-            s=tuple(r[h] for r in rows)
-            if h not in headers[:119] and s in sig: dup.append((h,sig[s]))
-            sig.setdefault(s,h)
+        profiles=result['products']['column_profiles']; assert list(profiles)==headers
+        groups={}; dup=[]
+        for h in headers: groups.setdefault(tuple(sorted(profiles[h].items())),[]).append(h)
+        for group in (g for g in groups.values() if len(g)>1):
+            sig={}
+            for h in group:
+                s=tuple(r[h] for r in rows)
+                if h not in headers[:119] and s in sig: dup.append((h,sig[s]))
+                sig.setdefault(s,h)
         assert not dup,dup[:10]
+        empty_columns=[h for h in headers if profiles[h]['empty']==len(rows)]; numeric_columns=[h for h in headers if profiles[h]['numeric']]
         pr=ET.parse(src/'feed-v4'/'Print_v4.xml').getroot(); source_groups={txt(n,'Print_Group') for n in pr.findall('./Products/Product/Positions/Position')}
         output_groups={r[dh[2]] for r in drows if r[dh[2]]}; assert output_groups<=source_groups
         if 'DPN_DW1' in source_groups: assert 'DPN_DW1' in output_groups
         if 'DPN-DW1' not in source_groups: assert 'DPN-DW1' not in output_groups
-        report={'products_rows':len(rows),'products_columns':len(headers),'new_columns':len(headers)-119,'dpo_rows':len(drows),'social_examples':sorted(set(social_values))[:12],'metal_parts_values':sorted(metal),'social_audit_values':sorted(audits),'boolean_columns':result['products']['boolean_columns'],'semantic_duplicates_removed':len(result['products']['semantic_duplicate_columns']),'exact_duplicates_removed':len(result['products']['exact_duplicate_columns']),'foreign_language_columns':foreign}
+        report={'products_rows':len(rows),'products_columns':len(headers),'new_columns':len(headers)-119,'dpo_rows':len(drows),'social_examples':sorted(set(social_values))[:12],'metal_parts_values':sorted(metal),'social_audit_values':sorted(audits),'boolean_columns':result['products']['boolean_columns'],'semantic_duplicates_removed':len(result['products']['semantic_duplicate_columns']),'exact_duplicates_removed':len(result['products']['exact_duplicate_columns']),'foreign_language_columns':foreign,'empty_columns':empty_columns,'numeric_columns':len(numeric_columns)}
         (out/'qa.json').write_text(json.dumps(report,ensure_ascii=False,indent=2),encoding='utf-8'); (out/'headers.txt').write_text('\n'.join(headers),encoding='utf-8')
         print(json.dumps(report,ensure_ascii=False,indent=2))
     return 0
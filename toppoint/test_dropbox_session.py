@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+import dropbox_session
+from dropbox_session import DropboxSession
+
+
+class Response:
+    def json(self) -> dict:
+        return {"session_id": "s1"}
+
+    def raise_for_status(self) -> None:
+        pass
+
+
+@pytest.fixture
+def posts(monkeypatch):
+    calls = []
+
+    def post(url, headers, data, timeout):
+        calls.append((url.rsplit("/files/", 1)[1], json.loads(headers["Dropbox-API-Arg"]), data))
+        return Response()
+
+    monkeypatch.setattr(dropbox_session.requests, "post", post)
+    monkeypatch.setattr(dropbox_session, "CHUNK_SIZE", 4)
+    return calls
+
+
+def test_empty_stream_still_overwrites_the_file(posts):
+    session = DropboxSession("/Toppoint/stock.xml", "token")
+    session.close()
+
+    assert [(endpoint, data) for endpoint, _, data in posts] == [("upload", b"")]
+    assert posts[0][1]["path"] == "/Toppoint/stock.xml"
+
+
+def test_short_stream_uses_a_single_upload(posts):
+    session = DropboxSession("/Toppoint/stock.xml", "token")
+    session.write(b"abc")
+    session.close()
+
+    assert [(endpoint, data) for endpoint, _, data in posts] == [("upload", b"abc")]
+
+
+def test_long_stream_commits_the_last_chunk_with_finish(posts):
+    session = DropboxSession("/Toppoint/stock.xml", "token")
+    session.write(b"0123456789")
+    session.close()
+
+    assert [(endpoint, data) for endpoint, _, data in posts] == [
+        ("upload_session/start", b"0123"),
+        ("upload_session/append_v2", b"4567"),
+        ("upload_session/finish", b"89"),
+    ]
+    assert posts[-1][1]["cursor"] == {"session_id": "s1", "offset": 8}
+
+
+def test_abort_leaves_dropbox_untouched(posts):
+    session = DropboxSession("/Toppoint/stock.xml", "token")
+    session.write(b"0123456789")
+    session.abort()
+
+    assert "upload_session/finish" not in [endpoint for endpoint, _, _ in posts]
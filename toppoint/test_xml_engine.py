@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import pytest
+
+import xml_engine
+from xml_engine import schema_drift, schema_fingerprint, schema_summary
+
+ENGINES = ["stdlib"] + (["lxml"] if xml_engine.LET is not None else [])
+
+
+def paths(summary: dict) -> dict[str, int]:
+    return {entry["path"]: entry["count"] for entry in summary["paths"]}
+
+
+def attributes(summary: dict) -> set[str]:
+    return {entry["path"] for entry in summary["attributes"]}
+
+
+@pytest.fixture(params=ENGINES)
+def engine(request, monkeypatch):
+    monkeypatch.setattr(xml_engine, "ENGINE", request.param)
+    monkeypatch.setattr(xml_engine, "SCHEMA_STABLE_RECORDS", 0)
+    return request.param
+
+
+def test_sample_does_not_stop_inside_the_first_record(tmp_path, engine):
+    # Il primo Product ha 300 Tier ripetuti: non devono passare per record.
+    tiers = "".join(f"<Tier>{index}</Tier>" for index in range(300))
+    products = "".join(
+        f'<Product><Code>{index}</Code>{tiers if index == 0 else ""}<Name>n{index}</Name><Image url="u{index}"/></Product>'
+        for index in range(5)
+    )
+    source = tmp_path / "feed.xml"
+    source.write_text(f"<Root><Products>{products}</Products></Root>", encoding="utf-8")
+
+    full = schema_summary(source)
+    sample = schema_summary(source, max_records=1)
+
+    assert sample["sampled"]["stopped_early"]
+    assert set(paths(sample)) == set(paths(full))
+    assert attributes(sample) == attributes(full)
+    assert paths(sample)["Root/Products/Product"] > 1
+
+
+def test_sample_past_the_end_matches_the_full_schema(tmp_path, engine):
+    records = "".join(f'<product code="{index}"><title>t{index}</title></product>' for index in range(20))
+    source = tmp_path / "feed.xml"
+    source.write_text(f"<Root>{records}</Root>", encoding="utf-8")
+
+    sample = schema_summary(source, max_records=10**6)
+
+    assert sample.pop("sampled") == {"records": 20, "bytes_read": source.stat().st_size, "stopped_early": False}
+    assert sample == schema_summary(source)
+
+
+def colors_feed(tmp_path, colors_per_product: list[int]):
+    products = "".join(
+        "<Product><Colors>" + '<Color id="c"/>' * count + "</Colors></Product>" for count in colors_per_product
+    )
+    source = tmp_path / f"colors-{len(colors_per_product)}-{sum(colors_per_product)}.xml"
+    source.write_text(f"<Root><Products>{products}</Products></Root>", encoding="utf-8")
+    return schema_fingerprint(schema_summary(source))
+
+
+def test_fingerprint_cardinality_is_per_parent_instance(tmp_path):
+    fingerprint = colors_feed(tmp_path, [1, 1, 2, 0])
+
+    assert fingerprint["paths"]["Root/Products/Product"] == "1..n"
+    assert fingerprint["paths"]["Root/Products/Product/Colors"] == "1"
+    assert fingerprint["paths"]["Root/Products/Product/Colors/Color"] == "0..n"
+    assert fingerprint["attributes"]["Root/Products/Product/Colors/Color/@id"] == "1"
+
+
+def test_data_changes_keep_the_same_structure(tmp_path):
+    before = colors_feed(tmp_path, [1, 1, 2, 0])
+    after = colors_feed(tmp_path, [3, 0, 1, 1, 1, 2])
+
+    assert schema_drift(before, after) == {}
+
+
+def test_a_field_becoming_mandatory_is_drift(tmp_path):
+    before = colors_feed(tmp_path, [1, 0, 1])
+    after = colors_feed(tmp_path, [1, 1, 1])
+
+    assert schema_drift(before, after) == {
+        "paths_cardinality": {"Root/Products/Product/Colors/Color": ["0..1", "1"]}
+    }
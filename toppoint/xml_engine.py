@@ -0,0 +1,339 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import xml.etree.ElementTree as ET
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    from lxml import etree as LET
+except ImportError:  # lxml è opzionale: si ripiega su ElementTree
+    LET = None
+
+# "lxml" (predefinito se installato) oppure "stdlib". Gli Element servono solo
+# ai loader, che li riducono subito a dict/record: vedi bench_parsers.py.
+ENGINE = os.getenv("TOPPOINT_XML_ENGINE", "lxml" if LET is not None else "stdlib")
+if ENGINE == "lxml" and LET is None:
+    ENGINE = "stdlib"
+# Record consecutivi senza percorsi nuovi prima che un campione di schema_summary si fermi.
+SCHEMA_STABLE_RECORDS = int(os.getenv("TOPPOINT_SCHEMA_STABLE_RECORDS", "200"))
+
+
+def iterparse(path: Path, events=("end",), tag: str | None = None):
+    """iterparse del backend attivo; con lxml il filtro ``tag`` avviene già nel parser C.
+
+    ``path`` può anche essere un file binario già aperto.
+    """
+    if ENGINE == "lxml":
+        return LET.iterparse(
+            path if hasattr(path, "read") else str(path),
+            events=events,
+            tag=tag,
+            huge_tree=True,
+            remove_comments=True,
+            remove_pis=True,
+            resolve_entities=False,
+        )
+    return ET.iterparse(path, events=events)
+
+
+def release(elem) -> None:
+    """Libera un elemento già letto (e, con lxml, i fratelli precedenti rimasti vuoti)."""
+    elem.clear()
+    if ENGINE == "lxml":
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+
+
+def local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1] if "}" in tag else tag
+
+
+class SchemaCollector:
+    """Percorsi, attributi ed esempi di testo di un XML, alimentato dagli eventi start/end.
+
+    Può seguire un parse dedicato (``schema_summary``) oppure, tramite
+    ``observing``, lo stesso parse di un loader degli indici.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path_counts: Counter[str] = Counter()
+        self.attribute_counts: Counter[str] = Counter()
+        self.samples: dict[str, list[str]] = defaultdict(list)
+        self.stack: list[str] = []
+        # Figli per istanza del genitore: tag contati nell'elemento aperto e,
+        # per percorso genitore e tag figlio, [genitori che lo contengono, minimo, massimo].
+        self.children: list[dict[str, int] | None] = []
+        self.occurrences: dict[str, dict[str, list[int]]] = {}
+        self.root_tag = None
+        self.element_count = 0
+        self.complete = False
+
+    def start(self, elem) -> None:
+        tag = local_name(elem.tag)
+        if self.root_tag is None:
+            self.root_tag = tag
+        self.stack.append(tag)
+        self.children.append(None)
+
+    def end(self, elem) -> None:
+        self.element_count += 1
+        current_path = "/".join(self.stack)
+        self.path_counts[current_path] += 1
+        children = self.children.pop()
+        if children:
+            occurrences = self.occurrences.get(current_path)
+            if occurrences is None:
+                occurrences = self.occurrences[current_path] = {}
+            for child, count in children.items():
+                seen = occurrences.get(child)
+                if seen is None:
+                    occurrences[child] = [1, count, count]
+                else:
+                    seen[0] += 1
+                    if count < seen[1]:
+                        seen[1] = count
+                    elif count > seen[2]:
+                        seen[2] = count
+        if self.children:
+            siblings = self.children[-1]
+            tag = self.stack[-1]
+            if siblings is None:
+                self.children[-1] = {tag: 1}
+            else:
+                siblings[tag] = siblings.get(tag, 0) + 1
+        for attr_name in elem.attrib:
+            self.attribute_counts[f"{current_path}/@{local_name(attr_name)}"] += 1
+
+        value = (elem.text or "").strip()
+        if value and len(self.samples[current_path]) < 5:
+            compact = re.sub(r"\s+", " ", value)
+            self.samples[current_path].append(compact[:500])
+
+        self.stack.pop()
+        self.complete = not self.stack
+
+    def per_parent(self, path: str) -> dict:
+        """Occurrences of ``path`` in each instance of its parent (none for the root)."""
+        parent, _, child = path.rpartition("/")
+        seen = self.occurrences.get(parent, {}).get(child)
+        if seen is None:
+            return {}
+        parents, minimum, maximum = seen
+        absent = parents < self.path_counts[parent]
+        return {"per_parent": {"min": 0 if absent else minimum, "max": maximum}}
+
+    def summary(self) -> dict:
+        return {
+            "file": self.path.name,
+            "size": self.path.stat().st_size,
+            "root_tag": self.root_tag,
+            "element_count": self.element_count,
+            "paths": [
+                {"path": key, "count": count, **self.per_parent(key), "samples": self.samples.get(key, [])}
+                for key, count in self.path_counts.most_common()
+            ],
+            "attributes": [
+                {"path": key, "count": count}
+                for key, count in self.attribute_counts.most_common()
+            ],
+        }
+
+
+def schema_summary(path: Path, max_records: int | None = None, max_bytes: int | None = None) -> dict:
+    """Schema dell'intero file o, con ``max_records``/``max_bytes``, di un campione.
+
+    Il campione si ferma al primo record oltre uno dei due limiti dopo
+    ``SCHEMA_STABLE_RECORDS`` record consecutivi senza percorsi o attributi
+    nuovi. I record sono i fratelli ripetuti al livello meno profondo
+    (``Product`` sotto ``Products``); i conteggi valgono solo per il campione,
+    descritto in ``"sampled"``. Finché è aperta la prima istanza di un
+    elemento sotto i figli della radice (il primo ``Product``, con i suoi
+    ``Tier`` ripetuti) il livello dei record non è ancora certo e il campione
+    non si ferma.
+    """
+    collector = SchemaCollector(path)
+    sampling = max_records is not None or max_bytes is not None
+    # (elemento, primo del suo tag sotto il genitore, tag dei figli già chiusi)
+    opened: list[tuple] = []
+    first_ancestors = 0
+    record_depth = None
+    records = known = last_new = 0
+    stopped = False
+    with open(path, "rb") as handle:
+        for event, elem in iterparse(handle, events=("start", "end")):
+            if event == "start":
+                collector.start(elem)
+                if sampling:
+                    first = not opened or elem.tag not in opened[-1][2]
+                    if first and len(opened) >= 2:
+                        first_ancestors += 1
+                    opened.append((elem, first, set()))
+                continue
+            collector.end(elem)
+            tag = elem.tag
+            release(elem)
+            if not sampling:
+                continue
+
+            first = opened.pop()[1]
+            depth = len(opened)
+            if first and depth >= 2:
+                first_ancestors -= 1
+            if not opened:
+                continue
+            siblings = opened[-1][2]
+            if tag in siblings and (record_depth is None or depth < record_depth):
+                record_depth, records = depth, 1
+            siblings.add(tag)
+            if depth != record_depth:
+                continue
+            records += 1
+            size = len(collector.path_counts) + len(collector.attribute_counts)
+            if size > known:
+                known, last_new = size, records
+            over = (max_records is not None and records >= max_records) or (
+                max_bytes is not None and handle.tell() >= max_bytes
+            )
+            if over and not first_ancestors and records - last_new >= SCHEMA_STABLE_RECORDS:
+                # Chiude gli antenati ancora aperti (Root, Products) come a fine file.
+                for ancestor, _, _ in reversed(opened):
+                    collector.end(ancestor)
+                stopped = True
+                break
+        bytes_read = handle.tell()
+
+    summary = collector.summary()
+    if sampling:
+        summary["sampled"] = {"records": records, "bytes_read": bytes_read, "stopped_early": stopped}
+    return summary
+
+
+def cardinality(minimum: int, maximum: int) -> str:
+    """Occorrenze per istanza del genitore: ``1``, ``0..1``, ``1..n`` o ``0..n``."""
+    if maximum > 1:
+        return "0..n" if minimum == 0 else "1..n"
+    return "0..1" if minimum == 0 else "1"
+
+
+def schema_fingerprint(summary: dict) -> dict:
+    """Impronta compatta di uno schema: percorsi e attributi con la loro cardinalità.
+
+    La cardinalità viene dalle occorrenze minime e massime in ogni istanza del
+    genitore, quindi non cambia con il numero di prodotti del feed né tra
+    schema completo e campionato; ``digest`` riassume tutto in un hash
+    confrontabile.
+    """
+    counts = {entry["path"]: entry["count"] for entry in summary["paths"]}
+    paths = {}
+    for entry in sorted(summary["paths"], key=lambda entry: entry["path"]):
+        per_parent = entry.get("per_parent", {"min": 1, "max": 1})
+        paths[entry["path"]] = cardinality(per_parent["min"], per_parent["max"])
+    attributes = {}
+    for entry in sorted(summary["attributes"], key=lambda entry: entry["path"]):
+        # Un attributo compare al più una volta per elemento.
+        element = entry["path"].rsplit("/", 1)[0]
+        attributes[entry["path"]] = cardinality(int(entry["count"] == counts[element]), 1)
+    fingerprint = {"root_tag": summary["root_tag"], "paths": paths, "attributes": attributes}
+    encoded = json.dumps(fingerprint, sort_keys=True).encode()
+    return {"digest": hashlib.blake2b(encoded, digest_size=8).hexdigest(), **fingerprint}
+
+
+def schema_drift(old: dict, new: dict) -> dict:
+    """Differenze strutturali tra due ``schema_fingerprint``: vuota se il digest coincide."""
+    if old["digest"] == new["digest"]:
+        return {}
+    drift = {}
+    if old["root_tag"] != new["root_tag"]:
+        drift["root_tag"] = [old["root_tag"], new["root_tag"]]
+    for kind in ("paths", "attributes"):
+        before, after = old[kind], new[kind]
+        added = sorted(after.keys() - before.keys())
+        removed = sorted(before.keys() - after.keys())
+        shifted = {path: [before[path], after[path]] for path in sorted(before.keys() & after.keys()) if before[path] != after[path]}
+        if added:
+            drift[f"added_{kind}"] = added
+        if removed:
+            drift[f"removed_{kind}"] = removed
+        if shifted:
+            drift[f"{kind}_cardinality"] = shifted
+    return drift
+
+
+_OBSERVED: tuple[Path, SchemaCollector] | None = None
+
+
+@contextmanager
+def observing(path: Path, collector: SchemaCollector):
+    """Inside the block, ``iter_records`` on ``path`` also feeds ``collector``: one parse, two results."""
+    global _OBSERVED
+    _OBSERVED = (Path(path), collector)
+    try:
+        yield collector
+    finally:
+        _OBSERVED = None
+
+
+def iter_records(path: Path, record_path: str, header: dict[str, str] | None = None):
+    """Stream the elements at ``record_path`` (relative to the root).
+
+    Each record is detached from the tree once the caller moves on, so only
+    the current record stays in memory unless the caller keeps a reference.
+    Leaf children of the root (e.g. ``Created``) are collected into ``header``.
+    """
+    if _OBSERVED is not None and _OBSERVED[0] == Path(path):
+        yield from _iter_records_events(path, record_path, header, _OBSERVED[1])
+    elif ENGINE == "lxml":
+        yield from _iter_records_lxml(path, record_path, header)
+    else:
+        yield from _iter_records_events(path, record_path, header)
+
+
+def _iter_records_events(path: Path, record_path: str, header: dict[str, str] | None, collector=None):
+    # Percorso generico su eventi start/end: è quello di stdlib e, con un
+    # collector, quello di entrambi i backend (lxml senza filtro sul tag).
+    parts = record_path.split("/")
+    stack = []
+    for event, elem in iterparse(path, events=("start", "end")):
+        if event == "start":
+            stack.append(elem)
+            if collector is not None:
+                collector.start(elem)
+            continue
+        if collector is not None:
+            collector.end(elem)
+        stack.pop()
+        if header is not None and len(stack) == 1 and len(elem) == 0:
+            header.setdefault(elem.tag, (elem.text or "").strip())
+        if (
+            len(stack) == len(parts)
+            and elem.tag == parts[-1]
+            and all(node.tag == tag for node, tag in zip(stack[1:], parts[:-1]))
+        ):
+            yield elem
+            stack[-1].remove(elem)
+
+
+def _iter_records_lxml(path: Path, record_path: str, header: dict[str, str] | None):
+    parts = record_path.split("/")
+    context = iterparse(path, events=("end",), tag=parts[-1])
+    for _, elem in context:
+        ancestors = []
+        parent = elem.getparent()
+        while parent is not None:
+            ancestors.append(parent.tag)
+            parent = parent.getparent()
+        # ancestors: dal genitore fino alla radice (esclusa dal confronto).
+        if not ancestors or ancestors[-2::-1] != parts[:-1]:
+            continue
+        yield elem
+        elem.getparent().remove(elem)
+    if header is not None and context.root is not None:
+        for child in context.root:
+            if len(child) == 0:
+                header.setdefault(child.tag, (child.text or "").strip())